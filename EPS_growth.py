@@ -2,21 +2,32 @@ import streamlit as st
 import requests
 import sys
 
+import snapshots
+from metrics import metric
+
 
 
 def get_forward_eps_growth(symbol, api_key):
     """
     Fetches the Forward EPS Growth for a given ticker
     using the Alpha Vantage Fundamental Data (OVERVIEW) endpoint.
-    Returns only the numerical growth percentage value or None if an error occurs.
+    Returns a percent MetricRecord whose value is None if an error occurs.
     """
+    return metric(_fetch_eps_growth_pct(symbol, api_key), "percent", "Alpha Vantage")
+
+
+def _fetch_eps_growth_pct(symbol, api_key):
+    """Returns the numerical growth percentage value or None."""
 
     url = f'https://www.alphavantage.co/query?function=OVERVIEW&symbol={symbol}&apikey={api_key}'
 
-    try:
-        response = requests.get(url, timeout=10)
+    def fetch_overview(proxies=None, timeout=10):
+        response = requests.get(url, proxies=proxies, timeout=timeout)
         response.raise_for_status()
-        data = response.json()
+        return response.json()
+
+    try:
+        data = snapshots.capture(symbol, "eps_growth", "alpha_vantage/OVERVIEW", fetch_overview)
 
 
         if "Note" not in data and data and "Symbol" in data:
@@ -32,14 +43,13 @@ def get_forward_eps_growth(symbol, api_key):
     proxies = st.secrets["proxies"]
 
     try:
-        response = requests.get(url, proxies=proxies, timeout=15)
-        response.raise_for_status()
-        data = response.json()
+        data = snapshots.capture(symbol, "eps_growth", "alpha_vantage/OVERVIEW",
+                                 lambda: fetch_overview(proxies, timeout=15))
 
-        if "Note" in data:
+        if not data or "Note" in data:
             return None
 
-        if not data or "Symbol" not in data:
+        if "Symbol" not in data:
             return None
 
         growth_raw = data.get("QuarterlyEarningsGrowthYOY", "0")
@@ -63,7 +73,7 @@ if __name__ == "__main__":
 
         result = get_forward_eps_growth(ticker, MY_API_KEY)
 
-        if result is None:
+        if result.value is None:
             if MY_API_KEY2 and MY_API_KEY2.strip():
                 result = get_forward_eps_growth(ticker, MY_API_KEY2)
 
@@ -4,6 +4,8 @@ import time
 import os
 import streamlit as st
 
+import snapshots
+
 
 def get_company_name(ticker):
     """
@@ -13,10 +15,13 @@ def get_company_name(ticker):
     polygon_api_key = st.secrets["polygon_api_key_1"]
     url = f"https://api.polygon.io/v3/reference/tickers/{ticker}?apiKey={polygon_api_key}"
 
-    try:
+    def fetch_reference():
         response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
+        return response.json() if response.status_code == 200 else None
+
+    try:
+        data = snapshots.capture(ticker, "company_name", "polygon", fetch_reference)
+        if data is not None:
             # Extract the company name from the results
             name = data.get("results", {}).get("name")
             if name:
@@ -29,9 +34,10 @@ def get_company_name(ticker):
         return ticker
 
 
-def analyze_ticker(ticker):
+def analyze_ticker(ticker, company_name=None):
     """
     Python script to perform fundamental equity analysis using the Gemini API with Google Search.
+    `company_name` may be passed in when the caller already resolved it.
     """
 
     # 1. Configuration
@@ -40,7 +46,8 @@ def analyze_ticker(ticker):
     # api_key = st.secrets["gemini"]
 
     # 2. Get the name of company using ticker through api of polygon.io
-    company_name = get_company_name(ticker)
+    if not company_name:
+        company_name = get_company_name(ticker)
 
     # 3. Construct the Prompts
     system_prompt = "You are a fundamental equity analyst. You MUST use Google Search to find real-time data. Your output MUST follow the strict formatting rules provided."
@@ -186,31 +193,41 @@ Rules:
 
     # 5. Execute with Exponential Backoff
     max_retries = 5
-    for attempt in range(max_retries):
-        try:
+    error = None
+
+    def ask_gemini():
+        """The Gemini response JSON (archived as the raw payload), or None with `error` set."""
+        nonlocal error
+        for attempt in range(max_retries):
             response = requests.post(url, json=payload, headers=headers)
 
             if response.status_code == 200:
-                result = response.json()
-                # Extracting content from Gemini response structure
-                content = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-
-                if not content:
-                    return "Error: Gemini returned an empty response."
-
-                return content
+                return response.json()
 
             elif response.status_code == 429:
                 wait = (2 ** attempt)
                 time.sleep(wait)
                 continue
             else:
-                return f"Error: {response.status_code} - {response.text}"
+                error = f"Error: {response.status_code} - {response.text}"
+                return None
+        return None
+
+    try:
+        result = snapshots.capture(ticker, "llm", "gemini", ask_gemini)
+    except Exception as e:
+        return f"An unexpected error occurred: {e}"
+
+    if result is None:
+        return error or "Failed to retrieve analysis after multiple attempts."
+
+    # Extracting content from Gemini response structure
+    content = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
 
-        except Exception as e:
-            return f"An unexpected error occurred: {e}"
+    if not content:
+        return "Error: Gemini returned an empty response."
 
-    return "Failed to retrieve analysis after multiple attempts."
+    return content
 
 
 if __name__ == "__main__":
@@ -0,0 +1,192 @@
+import os
+import re
+import sys
+import json
+import asyncio
+import hashlib
+import argparse
+import logging
+import datetime
+import contextlib
+
+import pandas as pd
+
+import snapshots
+from pipeline import run_parallel_analysis, build_report, format_report_rows
+from scoring import SECTIONS
+from bq_client import get_client
+from persistence import PersistenceBuffer
+
+# --- WINDOWS ASYNCIO FIX ---
+if sys.platform == 'win32':
+    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+
+CHECKPOINT_DIR = os.path.join(os.environ.get("LEAPS_CACHE_DIR", ".cache"), "batch")
+
+# Max concurrent calls per fetch-graph node across the whole batch
+SOURCE_LIMITS = {
+    "company_name": 4,
+    "yahoo": 4,
+    "finviz": 4,
+    "eps_growth": 2,
+    "moat": 2,  # Chromium
+    "iv_rank": 2,  # Chromium
+    "llm": 3,  # Gemini
+    "risk_rewards": 3,  # Gemini
+}
+MAX_TICKERS_IN_FLIGHT = 8
+
+LEADING_COLUMNS = ["Ticker", "Status", "Verdict", "Final Score", *SECTIONS, "Rejected by", "Skipped"]
+HEADER_WORDS = {"TICKER", "TICKERS", "SYMBOL", "SYMBOLS"}
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def parse_watchlist(text):
+    """Tickers from a txt/csv watchlist (comma, semicolon or whitespace separated), upper-cased and de-duplicated."""
+    tickers = []
+    for token in re.split(r"[\s,;]+", text):
+        ticker = token.strip().strip('"\'').upper()
+        if ticker and ticker not in HEADER_WORDS and ticker not in tickers:
+            tickers.append(ticker)
+    return tickers
+
+
+def checkpoint_path_for(tickers, full_report=False, replay=None):
+    """Default checkpoint file for a watchlist; the same list (and replay settings) resumes the same checkpoint."""
+    key = ",".join(sorted(tickers)) + f"|{full_report}" + (f"|replay {replay}" if replay else "")
+    key = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return os.path.join(CHECKPOINT_DIR, f"{key}.jsonl")
+
+
+def load_checkpoint(path):
+    """Completed rows from a checkpoint file, by ticker (failed tickers are retried on resume)."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partially written last line of an interrupted run
+            if row.get("Status") == "done":
+                done[row["Ticker"]] = row
+    return done
+
+
+def append_checkpoint(path, row):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(row, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def result_row(ticker, results, report):
+    """One flat results-table row: verdict, section scores and the formatted metric values."""
+    if report is None:
+        return {"Ticker": ticker, "Status": "error", "Verdict": "Analysis failed"}
+    summary = report["score_summary"]
+    row = {"Ticker": ticker, "Status": "done", "Verdict": summary["Verdict"],
+           "Final Score": float(summary["Final Score"]),
+           "Rejected by": ", ".join(results["gate_rejections"]), "Skipped": ", ".join(results["skipped"])}
+    row.update({section: float(summary[section]) for section in SECTIONS})
+    for r in format_report_rows(report["report_rows"]):
+        if r["Metric Name"] != "TOTAL":
+            row[r["Metric Name"]] = r["Value"]
+    return row
+
+
+def results_frame(rows):
+    """Results table with the summary columns first, best scores on top."""
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    leading = [c for c in LEADING_COLUMNS if c in df.columns]
+    df = df[leading + [c for c in df.columns if c not in leading]]
+    if "Final Score" in df.columns:
+        df = df.sort_values("Final Score", ascending=False, na_position="last")
+    return df.reset_index(drop=True)
+
+
+async def run_batch(tickers, checkpoint_path, full_report=False, on_result=None, buffer=None, replay=None,
+                    as_of=None):
+    """
+    Screens a watchlist with bounded concurrency (MAX_TICKERS_IN_FLIGHT tickers, SOURCE_LIMITS per source).
+    Every finished ticker is appended to the checkpoint file; tickers already completed there are not
+    re-run, so an interrupted batch resumes where it stopped.
+    `on_result(row)` is called for each row as it becomes available. With a PersistenceBuffer each
+    finished analysis is also saved to BigQuery in bulk. With `replay` (sources, see snapshots.replaying)
+    the analyses read archived payloads, as of `as_of`, instead of fetching. Returns the results table.
+    """
+    done = load_checkpoint(checkpoint_path)
+    rows = [done[t] for t in tickers if t in done]
+    todo = [t for t in tickers if t not in done]
+    logging.info(f"Batch of {len(tickers)} tickers: {len(rows)} already done, {len(todo)} to screen.")
+    if on_result:
+        for row in rows:
+            on_result(row)
+
+    limits = {name: asyncio.Semaphore(n) for name, n in SOURCE_LIMITS.items()}
+    in_flight = asyncio.Semaphore(MAX_TICKERS_IN_FLIGHT)
+
+    async def screen(ticker):
+        async with in_flight:
+            try:
+                with snapshots.replaying(replay, as_of) if replay else contextlib.nullcontext():
+                    results = await run_parallel_analysis(ticker, full_report=full_report, limits=limits)
+                    report = build_report(ticker, results)
+                row = result_row(ticker, results, report)
+                if buffer is not None and report is not None:
+                    await asyncio.to_thread(buffer.add, ticker, report)  # blocks while the buffer is full
+            except Exception as e:
+                logging.error(f"Batch analysis failed for {ticker}: {e}")
+                row = {"Ticker": ticker, "Status": "error", "Verdict": "Analysis failed"}
+            append_checkpoint(checkpoint_path, row)
+            return row
+
+    for next_row in asyncio.as_completed([screen(t) for t in todo]):
+        row = await next_row
+        rows.append(row)
+        if on_result:
+            on_result(row)
+    return results_frame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Screen a watchlist of tickers.")
+    parser.add_argument("watchlist", help="Text or CSV file with one or more tickers per line.")
+    parser.add_argument("--out", help="Export the results table to this CSV file (default: stdout).")
+    parser.add_argument("--checkpoint", help="Checkpoint file to resume from (default: derived from the list).")
+    parser.add_argument("--full-report", action="store_true", help="Run every fetcher even for rejected tickers.")
+    parser.add_argument("--save", action="store_true", help="Save the analyses to BigQuery (bulk, buffered).")
+    parser.add_argument("--replay", metavar="SOURCES", type=snapshots.parse_sources,
+                        help="Read archived payloads instead of fetching: 'all' or comma-separated sources "
+                             f"({', '.join(snapshots.REPLAY_SOURCES)}).")
+    parser.add_argument("--as-of", type=datetime.date.fromisoformat,
+                        help="With --replay: use the payloads archived up to this date (YYYY-MM-DD).")
+    args = parser.parse_args()
+    if args.save and args.replay:
+        parser.error("replayed analyses are not saved")
+
+    with open(args.watchlist, encoding="utf-8") as f:
+        watchlist = parse_watchlist(f.read())
+    checkpoint = args.checkpoint or checkpoint_path_for(
+        watchlist, args.full_report, f"{','.join(args.replay)} {args.as_of}" if args.replay else None)
+    logging.info(f"Checkpoint: {checkpoint}")
+
+    progress = []
+
+    def log_row(row):
+        progress.append(row)
+        logging.info(f"[{len(progress)}/{len(watchlist)}] {row['Ticker']}: {row['Verdict']}")
+
+    buffer = PersistenceBuffer(get_client()) if args.save else None
+    try:
+        table = asyncio.run(run_batch(watchlist, checkpoint, full_report=args.full_report, on_result=log_row,
+                                      buffer=buffer, replay=args.replay, as_of=args.as_of))
+    finally:
+        if buffer is not None:
+            buffer.close()
+    table.to_csv(args.out or sys.stdout, index=False)
@@ -0,0 +1,292 @@
+import os
+import re
+import sys
+import logging
+import threading
+import contextlib
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from google.cloud import bigquery
+from google.oauth2 import service_account
+from google.api_core.exceptions import BadRequest, Conflict, NotFound
+
+# "bigquery" (default) or "duckdb": a local single-process stand-in for tests and offline runs
+BACKEND = os.environ.get("LEAPS_BIGQUERY_BACKEND", "bigquery")
+LOCAL_DB_PATH = os.path.join(os.environ.get("LEAPS_CACHE_DIR", ".cache"), "bigquery.duckdb")
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_read_client = None
+_client_lock = threading.Lock()
+
+
+def service_account_info():
+    """The service account from st.secrets with its private key unescaped, or None if it is missing."""
+    if "SERVICE_ACCOUNT_JSON" not in st.secrets:
+        sys.stderr.write("ERROR: 'SERVICE_ACCOUNT_JSON' not found in st.secrets\n")
+        return None
+    service_info = dict(st.secrets["SERVICE_ACCOUNT_JSON"])
+    if "private_key" not in service_info:
+        sys.stderr.write("ERROR: 'private_key' missing from service account info\n")
+        return None
+    service_info["private_key"] = service_info["private_key"].replace("\\n", "\n")
+    return service_info
+
+
+def _create_client():
+    if BACKEND == "duckdb":
+        return DuckDBClient(LOCAL_DB_PATH)
+    service_info = service_account_info()
+    if service_info is None:
+        return None
+    try:
+        credentials = service_account.Credentials.from_service_account_info(service_info)
+        return bigquery.Client(credentials=credentials, project=service_info.get("project_id"))
+    except Exception as e:
+        sys.stderr.write(f"ERROR: BigQuery Authentication failed: {e}\n")
+        return None
+
+
+def get_client():
+    """
+    The process-wide BigQuery client (None if it cannot be created). One client shares its
+    credentials, token refresh and HTTP connection pool between the app, workers and fetchers,
+    inside or outside Streamlit.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+
+def reset_client():
+    """Drops the shared client, e.g. after switching BACKEND in tests."""
+    global _client, _read_client
+    with _client_lock:
+        _client = None
+        _read_client = None
+
+
+# --- Arrow reads ---
+# pandas dtypes matching QueryJob.to_dataframe() for the columns it maps to nullable types
+ARROW_PANDAS_TYPES = {pa.int64(): pd.Int64Dtype(), pa.bool_(): pd.BooleanDtype()}
+
+
+def _create_read_client():
+    try:
+        from google.cloud import bigquery_storage
+    except ImportError:
+        logger.warning("google-cloud-bigquery-storage is not installed, query results are downloaded over REST")
+        return False
+    service_info = service_account_info()
+    if service_info is None:
+        return False
+    try:
+        credentials = service_account.Credentials.from_service_account_info(service_info)
+        return bigquery_storage.BigQueryReadClient(credentials=credentials)
+    except Exception as e:
+        logger.warning(f"BigQuery Storage Read client unavailable, query results are downloaded over REST: {e}")
+        return False
+
+
+def get_read_client():
+    """The process-wide BigQuery Storage Read API client, or None when it is not available."""
+    global _read_client
+    if BACKEND == "duckdb":
+        return None
+    if _read_client is None:
+        with _client_lock:
+            if _read_client is None:
+                _read_client = _create_read_client()
+    return _read_client or None
+
+
+def read_arrow(client, sql, params=()):
+    """
+    Runs a query and returns its result as a pyarrow.Table. Large results are streamed in Arrow
+    record batches through the Storage Read API instead of being paged as JSON rows over REST,
+    so only project the columns you need.
+    """
+    job = client.query(sql, job_config=bigquery.QueryJobConfig(query_parameters=list(params)))
+    return job.to_arrow(bqstorage_client=get_read_client(), create_bqstorage_client=False)
+
+
+def arrow_frame(table):
+    """A pandas view of an Arrow query result, with the dtypes to_dataframe() would give."""
+    return table.to_pandas(types_mapper=ARROW_PANDAS_TYPES.get)
+
+
+# --- Local DuckDB stand-in ---
+# Implements the small part of bigquery.Client this repo uses, translating its BigQuery SQL
+# (backtick paths, @params, UNNEST of parameter arrays, MERGE without INTO, type names) to DuckDB.
+DUCKDB_TYPES = {"STRING": "VARCHAR", "FLOAT64": "DOUBLE", "FLOAT": "DOUBLE", "INT64": "BIGINT",
+                "INTEGER": "BIGINT", "BOOL": "BOOLEAN", "BOOLEAN": "BOOLEAN", "DATE": "DATE",
+                "TIMESTAMP": "TIMESTAMPTZ"}
+BIGQUERY_TYPES = {"VARCHAR": "STRING", "DOUBLE": "FLOAT64", "BIGINT": "INT64", "INTEGER": "INT64",
+                  "BOOLEAN": "BOOL", "DATE": "DATE", "TIMESTAMP WITH TIME ZONE": "TIMESTAMP"}
+
+
+def _local_name(path):
+    """`project.dataset.table` (or `dataset.table`) -> "dataset"."table"."""
+    parts = path.split(".")
+    return ".".join(f'"{p}"' for p in parts[-2:])
+
+
+def _parameter_value(param):
+    if isinstance(param, bigquery.StructQueryParameter):
+        return dict(param.struct_values)
+    if isinstance(param, bigquery.ArrayQueryParameter):
+        return [_parameter_value(v) if isinstance(v, bigquery.StructQueryParameter) else v for v in param.values]
+    return param.value
+
+
+class _Field:
+    def __init__(self, name, field_type):
+        self.name = name
+        self.field_type = field_type
+
+
+class _Table:
+    def __init__(self, table_id, schema=()):
+        self.table_id = table_id
+        self.schema = list(schema)
+
+
+class _Job:
+    def __init__(self, frame, job_id=None, error=None):
+        self._frame = frame
+        self.job_id = job_id
+        self.state = "DONE"
+        self.error_result = {"message": error} if error else None
+
+    def result(self):
+        if self.error_result:
+            raise BadRequest(self.error_result["message"])
+        return self
+
+    def __iter__(self):
+        return (row for row in self._frame.itertuples(index=False))
+
+    def to_dataframe(self, **kwargs):
+        return self._frame.copy()
+
+    def to_arrow(self, **kwargs):
+        return pa.Table.from_pandas(self._frame, preserve_index=False)
+
+
+class DuckDBClient:
+    """A file-backed DuckDB database behind the bigquery.Client calls used by storage and the app."""
+    project = "local"
+
+    def __init__(self, path):
+        import duckdb
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = duckdb.connect(path)
+        self._lock = threading.RLock()
+        self._conn.execute("CREATE SCHEMA IF NOT EXISTS _meta")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS _meta.jobs (job_id VARCHAR PRIMARY KEY)")
+        self._conn.execute("ALTER TABLE _meta.jobs ADD COLUMN IF NOT EXISTS error VARCHAR")
+
+    def _translate(self, sql):
+        schemas = {path.split(".")[-2] for path in re.findall(r"`([^`]+\.[^`]+)`", sql)}
+        for schema in schemas:
+            self._conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+        sql = re.sub(r"`([^`]+)`", lambda m: _local_name(m.group(1)) if "." in m.group(1) else f'"{m.group(1)}"', sql)
+        sql = re.sub(r"UNNEST\(@(\w+)\)", r"(SELECT UNNEST($\1, recursive := true))", sql)
+        sql = re.sub(r"@(\w+)", r"$\1", sql)
+        sql = re.sub(r"\bFLOAT64\b", "DOUBLE", re.sub(r"\bINT64\b", "BIGINT", sql))
+        return re.sub(r"\bMERGE\s+(?!INTO\b)", "MERGE INTO ", sql)
+
+    def _claim_job(self, job_id):
+        if job_id is None:
+            return
+        if self._conn.execute("SELECT 1 FROM _meta.jobs WHERE job_id = ?", [job_id]).fetchone():
+            raise Conflict(f"Already Exists: Job local:{job_id}")
+        self._conn.execute("INSERT INTO _meta.jobs (job_id) VALUES (?)", [job_id])
+
+    def get_job(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT error FROM _meta.jobs WHERE job_id = ?", [job_id]).fetchone()
+        if row is None:
+            raise NotFound(f"Not found: Job local:{job_id}")
+        return _Job(None, job_id, row[0])
+
+    def query(self, sql, job_config=None, job_id=None):
+        params = {p.name: _parameter_value(p) for p in getattr(job_config, "query_parameters", None) or []}
+        with self._lock:
+            self._claim_job(job_id)
+            cursor = self._conn.execute(self._translate(sql), params or None)
+            frame = cursor.df() if cursor.description else None
+        return _Job(frame)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Makes the enclosed calls one atomic write; other threads wait until it commits."""
+        with self._lock:
+            self._conn.execute("BEGIN TRANSACTION")
+            try:
+                yield self
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def create_table(self, table, exists_ok=False):
+        name = _local_name(f"{table.dataset_id}.{table.table_id}")
+        columns = ", ".join(f'"{f.name}" {DUCKDB_TYPES.get(f.field_type, "VARCHAR")}' for f in table.schema)
+        with self._lock:
+            self._conn.execute(f'CREATE SCHEMA IF NOT EXISTS {name.split(".")[0]}')
+            self._conn.execute(f"CREATE TABLE {'IF NOT EXISTS ' if exists_ok else ''}{name} ({columns})")
+        return table
+
+    def get_table(self, path):
+        schema, table = path.split(".")[-2:]
+        with self._lock:
+            rows = self._conn.execute("SELECT column_name, data_type FROM information_schema.columns "
+                                      "WHERE table_schema = ? AND table_name = ? ORDER BY ordinal_position",
+                                      [schema, table]).fetchall()
+        if not rows:
+            raise NotFound(f"Not found: Table {path}")
+        return _Table(table, [_Field(name, BIGQUERY_TYPES.get(kind, kind)) for name, kind in rows])
+
+    def list_tables(self, dataset):
+        with self._lock:
+            rows = self._conn.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = ?",
+                                      [dataset.split(".")[-1]]).fetchall()
+        return [_Table(name) for (name,) in rows]
+
+    def delete_table(self, path, not_found_ok=False):
+        with self._lock:
+            self._conn.execute(f"DROP TABLE {'IF EXISTS ' if not_found_ok else ''}{_local_name(path)}")
+
+    def load_table_from_dataframe(self, frame, path, job_id=None, job_config=None):
+        name = _local_name(path)
+        disposition = getattr(job_config, "write_disposition", None)
+        schema = getattr(job_config, "schema", None)
+        with self._lock:
+            self._claim_job(job_id)
+            self._conn.execute(f'CREATE SCHEMA IF NOT EXISTS {name.split(".")[0]}')
+            self._conn.register("_load_frame", frame)
+            try:
+                if disposition == "WRITE_TRUNCATE":
+                    self._conn.execute(f"DROP TABLE IF EXISTS {name}")
+                if schema:
+                    columns = ", ".join(f'"{f.name}" {DUCKDB_TYPES.get(f.field_type, "VARCHAR")}' for f in schema)
+                    self._conn.execute(f"CREATE TABLE IF NOT EXISTS {name} ({columns})")
+                else:
+                    self._conn.execute(f"CREATE TABLE IF NOT EXISTS {name} AS SELECT * FROM _load_frame LIMIT 0")
+                self._conn.execute(f"INSERT INTO {name} BY NAME SELECT * FROM _load_frame")
+            except Exception as e:
+                # Like a failed BigQuery job, the id stays taken and get_job reports the error
+                if job_id is not None:
+                    self._conn.execute("UPDATE _meta.jobs SET error = ? WHERE job_id = ?", [str(e), job_id])
+                raise
+            finally:
+                self._conn.unregister("_load_frame")
+        return _Job(None, job_id)
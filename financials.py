@@ -0,0 +1,206 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# --- Canonical statement fields ---
+# canonical field -> (Yahoo Finance row labels, Alpha Vantage report keys), both in priority order.
+CANONICAL_FIELDS = {
+    "total_assets": (["Total Assets"], ["totalAssets"]),
+    "total_liabilities": (
+        ["Total Liabilities Net Minority Interest", "Total Liabilities Net Minor Interest", "Total Liab",
+         "Total Liabilities"],
+        ["totalLiabilities"]),
+    "current_liabilities": (["Current Liabilities", "Total Current Liabilities"], ["totalCurrentLiabilities"]),
+    "non_current_liabilities": (
+        ["Total Non Current Liabilities Net Minority Interest", "Non Current Liabilities"],
+        ["totalNonCurrentLiabilities"]),
+    "cash": (
+        ["Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments"],
+        ["cashAndCashEquivalentsAtCarryingValue"]),
+    "total_debt": (["Total Debt"], []),
+    "short_term_debt": (["Current Debt", "Current Debt And Capital Lease Obligation"], ["shortTermDebt"]),
+    "long_term_debt": (["Long Term Debt", "Long Term Debt And Capital Lease Obligation"], ["longTermDebt"]),
+    "net_debt": (["Net Debt"], []),
+    "convertible_debt": ([], []),
+    "operating_cash_flow": (["Operating Cash Flow"], ["operatingCashflow"]),
+    "capital_expenditure": (["Capital Expenditure"], ["capitalExpenditures"]),
+    "free_cash_flow": (["Free Cash Flow"], []),
+    "total_revenue": (["Total Revenue"], ["totalRevenue"]),
+    "ebit": (["EBIT", "Operating Income"], ["operatingIncome"]),
+    "ebitda": (["EBITDA", "Normalized EBITDA"], ["ebitda"]),
+}
+CANONICAL_COLUMNS = list(CANONICAL_FIELDS)
+
+# Yahoo labels that vary by filer are matched by pattern; results are memoized into the label index.
+YAHOO_LABEL_PATTERNS = [
+    (re.compile(r"convertible", re.IGNORECASE), "convertible_debt"),
+]
+
+# Alpha Vantage endpoint that can fill each canonical field.
+ALPHA_VANTAGE_FUNCTIONS = {
+    "total_assets": "BALANCE_SHEET",
+    "total_liabilities": "BALANCE_SHEET",
+    "cash": "BALANCE_SHEET",
+    "net_debt": "BALANCE_SHEET",
+    "operating_cash_flow": "CASH_FLOW",
+    "free_cash_flow": "CASH_FLOW",
+    "total_revenue": "INCOME_STATEMENT",
+    "ebit": "INCOME_STATEMENT",
+    "ebitda": "INCOME_STATEMENT",
+}
+
+# Precompiled label index: Yahoo row label -> (canonical field, priority)
+_YAHOO_LABEL_INDEX = {
+    label: (field, priority)
+    for field, (yahoo_labels, _) in CANONICAL_FIELDS.items()
+    for priority, label in enumerate(yahoo_labels)
+}
+
+
+@lru_cache(maxsize=4096)
+def _resolve_yahoo_label(label):
+    if label in _YAHOO_LABEL_INDEX:
+        return _YAHOO_LABEL_INDEX[label]
+    for pattern, field in YAHOO_LABEL_PATTERNS:
+        if pattern.search(str(label)):
+            return field, len(CANONICAL_FIELDS[field][0])
+    return None
+
+
+def empty_frame():
+    return pd.DataFrame(columns=CANONICAL_COLUMNS, index=pd.DatetimeIndex([], name="period"), dtype="float64")
+
+
+def normalize_yahoo(*statements):
+    """
+    Maps one or more Yahoo Finance statements (labels x periods) into a canonical
+    frame indexed by period end (most recent first) with one float column per field.
+    When several labels map to the same field, the highest-priority non-null value wins per period.
+    """
+    statements = [s for s in statements if s is not None and not s.empty]
+    if not statements:
+        return empty_frame()
+
+    rows = pd.concat(statements)
+    resolved = [_resolve_yahoo_label(label) for label in rows.index]
+    mask = np.array([r is not None for r in resolved], dtype=bool)
+    if not mask.any():
+        return empty_frame()
+
+    rows = rows[mask].apply(pd.to_numeric, errors="coerce")
+    rows.index = pd.MultiIndex.from_tuples([r for r in resolved if r is not None], names=["field", "priority"])
+    frame = rows.sort_index().groupby(level="field").first().T
+    frame.index = pd.DatetimeIndex(pd.to_datetime(frame.index), name="period")
+    frame = frame.sort_index(ascending=False).reindex(columns=CANONICAL_COLUMNS).astype("float64")
+    return add_derived_fields(frame)
+
+
+def normalize_alpha_vantage(*reports):
+    """
+    Maps Alpha Vantage report lists (e.g. BALANCE_SHEET and CASH_FLOW 'quarterlyReports')
+    into the same canonical frame layout as normalize_yahoo.
+    """
+    parts = []
+    for report_list in reports:
+        if not report_list:
+            continue
+        raw = pd.DataFrame(report_list)
+        if "fiscalDateEnding" not in raw.columns:
+            continue
+        raw.index = pd.DatetimeIndex(pd.to_datetime(raw.pop("fiscalDateEnding"), errors="coerce"), name="period")
+        parts.append(raw[~raw.index.isna()].apply(pd.to_numeric, errors="coerce"))
+    if not parts:
+        return empty_frame()
+
+    raw = pd.concat(parts, axis=1)
+    raw = raw.T.groupby(level=0).first().T
+    frame = pd.DataFrame(index=raw.index, columns=CANONICAL_COLUMNS, dtype="float64")
+    for field, (_, av_keys) in CANONICAL_FIELDS.items():
+        present = [k for k in av_keys if k in raw.columns]
+        if present:
+            frame[field] = raw[present].bfill(axis=1).iloc[:, 0]
+
+    # Alpha Vantage reports capex as a positive outflow; Yahoo reports it negative.
+    frame["capital_expenditure"] = -frame["capital_expenditure"].abs()
+    if {"shortTermDebt", "longTermDebt"} & set(raw.columns):
+        frame["total_debt"] = raw.reindex(columns=["shortTermDebt", "longTermDebt"]).fillna(0).sum(axis=1)
+    return add_derived_fields(frame.sort_index(ascending=False))
+
+
+def add_derived_fields(frame):
+    """Fills fields that can be derived from other canonical fields, column-wise across all periods."""
+    frame = frame.copy()
+    liabilities_parts = frame[["current_liabilities", "non_current_liabilities"]]
+    frame["total_liabilities"] = frame["total_liabilities"].fillna(
+        liabilities_parts.sum(axis=1, min_count=1))
+    frame["net_debt"] = frame["net_debt"].fillna(frame["total_debt"] - frame["cash"])
+    frame["free_cash_flow"] = frame["free_cash_flow"].fillna(
+        frame["operating_cash_flow"] + frame["capital_expenditure"])
+    return frame
+
+
+def merge_statements(primary, fallback):
+    """
+    Fills fields whose latest value is missing in `primary` with the same field from `fallback`,
+    aligned on period end dates. Fallback periods newer than the latest primary period are ignored,
+    and values present in `primary` are never overridden.
+    """
+    if fallback is None or fallback.empty:
+        return primary
+    if primary is None or primary.empty:
+        return fallback
+
+    latest_period = primary.index[0]
+    index = primary.index.union(fallback.index[fallback.index <= latest_period]).sort_values(ascending=False)
+    merged = primary.reindex(index)
+    aligned = fallback.reindex(index)
+    gaps = merged.columns[(merged.iloc[0].isna() & aligned.iloc[0].notna()).to_numpy()]
+    if gaps.empty:
+        return primary
+    merged[gaps] = merged[gaps].fillna(aligned[gaps])
+    return add_derived_fields(merged.rename_axis("period"))
+
+
+def missing_fields(frame, fields, periods=1):
+    """Returns the fields that lack a value in any of the latest `periods` periods."""
+    if frame.empty or len(frame) < periods:
+        return list(fields)
+    head = frame[list(fields)].iloc[:periods]
+    return list(head.columns[head.isna().any()])
+
+
+def alpha_vantage_functions_for(fields):
+    """Alpha Vantage endpoints needed to fill the given canonical fields."""
+    return {ALPHA_VANTAGE_FUNCTIONS[f] for f in fields if f in ALPHA_VANTAGE_FUNCTIONS}
+
+
+# --- Metric formulas (column operations over the canonical frame) ---
+def latest(frame, field):
+    """Most recent value of a field, or None."""
+    if frame.empty:
+        return None
+    val = frame[field].iat[0]
+    return None if pd.isna(val) else float(val)
+
+
+def ttm(frame, field, periods=4):
+    """Trailing sum over the latest `periods` quarterly values, or None if all are missing."""
+    values = frame[field].iloc[:periods]
+    if values.isna().all():
+        return None
+    return float(values.sum())
+
+
+def yoy(frame, field):
+    """Change of the latest period versus the prior one, relative to the prior magnitude."""
+    values = frame[field].iloc[:2]
+    if len(values) < 2 or values.isna().any() or values.iat[1] == 0:
+        return None
+    return float((values.iat[0] - values.iat[1]) / abs(values.iat[1]))
+
+
+def ratio(frame, numerator, denominator):
+    """Per-period ratio of two fields (NaN where the denominator is 0 or missing)."""
+    return frame[numerator] / frame[denominator].replace(0, np.nan)
@@ -5,6 +5,9 @@ import re
 import logging
 import streamlit as st
 
+import snapshots
+from metrics import metric, parse_number
+
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -58,39 +61,48 @@ def scrape_finviz(ticker):
         "https": proxy_url
     }
 
-    response = None
-    last_error = ""
-
+    error = None
 
-    for attempt in range(1, 3):
-        try:
-            logging.info(f"Attempt {attempt}: Fetching {ticker} via Proxy http://gw.dataimpulse.com:823..")
+    def fetch_snapshot_table():
+        """HTML of the quote page's snapshot table (the raw payload that gets archived), or None."""
+        nonlocal error
+        response = None
+        last_error = ""
 
-            response = requests.get(url, headers=headers, proxies=proxies, timeout=15)
+        for attempt in range(1, 3):
+            try:
+                logging.info(f"Attempt {attempt}: Fetching {ticker} via Proxy http://gw.dataimpulse.com:823..")
 
-            if response.status_code == 200:
-                logging.info(f"Successfully fetched {ticker} on attempt {attempt}")
-                break  # Success, exit retry loop
-            else:
-                last_error = f"Status Code: {response.status_code}"
-                logging.warning(f"Attempt {attempt} failed for {ticker}: {last_error}")
+                response = requests.get(url, headers=headers, proxies=proxies, timeout=15)
 
-        except Exception as e:
-            last_error = str(e)
-            logging.error(f"Attempt {attempt} connection error for {ticker}: {last_error}")
+                if response.status_code == 200:
+                    logging.info(f"Successfully fetched {ticker} on attempt {attempt}")
+                    break  # Success, exit retry loop
+                else:
+                    last_error = f"Status Code: {response.status_code}"
+                    logging.warning(f"Attempt {attempt} failed for {ticker}: {last_error}")
 
-    # Final check after 2 retries
-    if response is None or response.status_code != 200:
-        logging.critical(f"All retries failed for {ticker}. Final Error: {last_error}")
-        return {"error": f"Failed to fetch Finviz page after 2 tries. Last error: {last_error}"}
+            except Exception as e:
+                last_error = str(e)
+                logging.error(f"Attempt {attempt} connection error for {ticker}: {last_error}")
 
+        # Final check after 2 retries
+        if response is None or response.status_code != 200:
+            logging.critical(f"All retries failed for {ticker}. Final Error: {last_error}")
+            error = f"Failed to fetch Finviz page after 2 tries. Last error: {last_error}"
+            return None
 
-    soup = BeautifulSoup(response.text, "html.parser")
+        table = BeautifulSoup(response.text, "html.parser").find("table", class_="snapshot-table2")
+        if not table:
+            error = "Finviz data table not found. Invalid ticker or layout change."
+            return None
+        return str(table)
 
-    table = soup.find("table", class_="snapshot-table2")
+    table_html = snapshots.capture(ticker, "finviz", "snapshot_table", fetch_snapshot_table)
+    if table_html is None:
+        return {"error": error or "Finviz snapshot table not available."}
 
-    if not table:
-        return {"error": "Finviz data table not found. Invalid ticker or layout change."}
+    table = BeautifulSoup(table_html, "html.parser").find("table")
 
 
     finviz_data = {}
@@ -109,10 +121,10 @@ def scrape_finviz(ticker):
     extracted_data = {
         "Ticker": ticker,
         "Company": company_name,
-        "Net Insider Buying vs Selling (%)": insider_trans,
-        "Net Insider Activity": insider_activity,
-        "Institutional Ownership (%)": finviz_data.get("Inst Own", "N/A"),
-        "Short Float (%)": finviz_data.get("Short Float", "N/A")
+        "Net Insider Buying vs Selling (%)": metric(parse_number(insider_trans), "percent", "Finviz"),
+        "Net Insider Activity": metric(None if insider_activity == "N/A" else insider_activity, "category", "Finviz"),
+        "Institutional Ownership (%)": metric(parse_number(finviz_data.get("Inst Own")), "percent", "Finviz"),
+        "Short Float (%)": metric(parse_number(finviz_data.get("Short Float")), "percent", "Finviz")
     }
 
     return extracted_data
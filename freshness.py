@@ -0,0 +1,87 @@
+import datetime
+
+from metrics import SKIPPED_NOTE, FAILED_NOTE
+
+# --- Freshness policy ---
+# Max age in days of a stored value before a refresh fetches it again; 0 means always refetch.
+# "sources" overrides the age for values that came from a specific (usually fallback) source.
+# basis "filing": only changes when a new quarterly / annual filing lands, so it stays fresh
+# regardless of age while the latest statement period is unchanged.
+FRESHNESS_POLICY = {
+    # Market-driven: move by the second
+    "Current stock price": {"max_age": 0},
+    "Market cap": {"max_age": 0},
+    "52 week low": {"max_age": 0},
+    "52 weeks high": {"max_age": 0},
+    "IV Rank": {"max_age": 0},
+    "Short Float (%)": {"max_age": 1},
+    "Cash Burn Severity": {"max_age": 1, "basis": "filing"},  # TTM FCF part; rescaled to the current market cap
+    # Slow-moving market data
+    "latest expiration date": {"max_age": 7},
+    "Net Insider Buying vs Selling (%)": {"max_age": 7},
+    "Net Insider Activity": {"max_age": 7},
+    "Forward EPS Growth (%)": {"max_age": 7},
+    "Shares Outstanding": {"max_age": 30},
+    "Institutional Ownership (%)": {"max_age": 30},
+    "Total insider ownership %": {"max_age": 30},
+    # Statement-derived: change with quarterly / annual filings
+    "Total Assets": {"max_age": 30, "basis": "filing"},
+    "Total Liabilities": {"max_age": 30, "basis": "filing"},
+    "Assets / Liabilities Ratio": {"max_age": 30, "basis": "filing"},
+    "Runway": {"max_age": 30, "basis": "filing"},
+    "Net Debt": {"max_age": 30, "basis": "filing"},
+    "EBITDA": {"max_age": 30, "basis": "filing"},
+    "Net Debt / EBITDA": {"max_age": 30, "basis": "filing"},
+    "Share Count Growth": {"max_age": 30, "basis": "filing"},
+    "Capital Structure Pressure": {"max_age": 30, "basis": "filing"},
+    "Degree of Operating Leverage": {"max_age": 90, "basis": "filing"},
+    # Qualitative: change by the year
+    "CEO Ownership %": {"max_age": 90, "basis": "filing"},
+    "GuruFocus Moat Score": {"max_age": 90, "sources": {"Gemini (GuruFocus)": 30}, "basis": "filing"},
+    "Business Model & Value Proposition": {"max_age": 180, "basis": "filing"},
+}
+DEFAULT_MAX_AGE = 1
+
+# Report narratives, keyed by report section (all filing-based)
+NARRATIVE_MAX_AGE = {
+    "llm_analysis": 180,
+    "risk_reward": 30,
+}
+
+
+def max_age(name, source=None):
+    """Max age in days of a stored value of `name` obtained from `source`."""
+    policy = FRESHNESS_POLICY.get(name, {})
+    return policy.get("sources", {}).get(source, policy.get("max_age", DEFAULT_MAX_AGE))
+
+
+def _age_days(as_of, today=None):
+    if not as_of:
+        return None
+    today = today or datetime.date.today()
+    return (today - datetime.date.fromisoformat(str(as_of)[:10])).days
+
+
+def is_filing_based(name):
+    return FRESHNESS_POLICY.get(name, {}).get("basis") == "filing"
+
+
+def is_fresh(name, record, today=None, filing_unchanged=False):
+    """
+    True while a stored MetricRecord is younger than its policy's max age, or, for filing-based
+    metrics, while no new filing has landed since it was stored. A stored None (e.g. an undisclosed
+    CEO stake) follows the same rules; only placeholders of skipped or failed fetches are never fresh.
+    """
+    if record.value is None and record.note in (SKIPPED_NOTE, FAILED_NOTE):
+        return False
+    if filing_unchanged and is_filing_based(name):
+        return True
+    age = _age_days(record.as_of, today)
+    return age is not None and age < max_age(name, record.source)
+
+
+def narrative_is_fresh(key, as_of, today=None, filing_unchanged=False):
+    if filing_unchanged:
+        return True
+    age = _age_days(as_of, today)
+    return age is not None and age < NARRATIVE_MAX_AGE.get(key, DEFAULT_MAX_AGE)
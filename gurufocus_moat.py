@@ -8,10 +8,13 @@ import tempfile
 import subprocess
 from playwright.sync_api import sync_playwright
 from google.cloud import bigquery
-from google.oauth2 import service_account
 import streamlit as st
 import requests
 
+import snapshots
+from metrics import metric
+from bq_client import get_client
+
 PROXY_HOST = "gw.dataimpulse.com"
 PROXY_PORT = "823"
 PROXY_USER = st.secrets["PROXY_USER"]
@@ -26,6 +29,7 @@ USER_AGENTS = [
 
 
 def get_moat_score(ticker: str):
+    """Returns the GuruFocus Moat Score as a MetricRecord (BigQuery, then scraping, then Gemini)."""
     ticker = ticker.upper().strip()
     result = "N/A"
 
@@ -33,30 +37,11 @@ def get_moat_score(ticker: str):
     sys.stderr.write(f"INFO: TIER 1 - Initializing bigquery connection for {ticker}\n")
     # start block
     try:
-        if "SERVICE_ACCOUNT_JSON" not in st.secrets:
-            sys.stderr.write("ERROR: 'SERVICE_ACCOUNT_JSON' not found in st.secrets\n")
-            return "N/A"
-        service_info = dict(st.secrets["SERVICE_ACCOUNT_JSON"])
-
-        # 2. Fix the private key (Handle Streamlit's newline escaping)
-        if "private_key" in service_info:
-            service_info["private_key"] = service_info["private_key"].replace("\\n", "\n")
-        else:
-            sys.stderr.write("ERROR: 'private_key' missing from service account info\n")
-            return "N/A"
-
-        # 3. Initialize BigQuery Client
-        try:
-            credentials = service_account.Credentials.from_service_account_info(service_info)
-            client = bigquery.Client(credentials=credentials, project=service_info.get("project_id"))
-        except Exception as e:
-            sys.stderr.write(f"ERROR: BigQuery Authentication failed: {e}\n")
-            return "N/A"
-        # end block
-
-        # Initialize BigQuery Client
-        # credentials = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_JSON)
-        # client = bigquery.Client(credentials=credentials, project=credentials.project_id)
+        # A replay reads the archived query result and needs no connection
+        replayed = snapshots.is_replayed("moat")
+        client = None if replayed else get_client()
+        if client is None and not replayed:
+            return metric(None, "score", "GuruFocus")
 
         # SQL Query for BigQuery
         query = f"""
@@ -70,15 +55,15 @@ def get_moat_score(ticker: str):
             ]
         )
 
-        query_job = client.query(query, job_config=job_config)
-        results = query_job.result()
+        results = snapshots.capture(ticker, "moat", "bigquery", lambda: [
+            {"moat_number": row.moat_number} for row in client.query(query, job_config=job_config).result()])
 
         # Check for results
         for row in results:
-            if row.moat_number is not None:
-                result = str(row.moat_number)
+            if row["moat_number"] is not None:
+                result = str(row["moat_number"])
                 print(f"[SUCCESS] Moat Score found in BigQuery for {ticker}: {result}")
-                return result
+                return metric(result, "score", "GuruFocus (BigQuery)")
 
     except Exception as e:
         print(f"[ERROR] BigQuery access failed: {e}")
@@ -90,64 +75,72 @@ def get_moat_score(ticker: str):
     proxy_server = f"http://gw.dataimpulse.com:823"
     max_retries = 1
 
-    for attempt in range(1, max_retries + 1):
-        ua = random.choice(USER_AGENTS)
-        print(f"[INFO] TIER 2: Scraping attempt {attempt}/{max_retries} for {ticker}...")
+    def scrape_moat_row():
+        """{"text": Moat Score table row (or the whole page if there is none), "row_found"}, or None."""
+        for attempt in range(1, max_retries + 1):
+            ua = random.choice(USER_AGENTS)
+            print(f"[INFO] TIER 2: Scraping attempt {attempt}/{max_retries} for {ticker}...")
 
-        with sync_playwright() as p:
-            browser = None
-            try:
-                launch_args = ["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage", "--disable-gpu"]
+            with sync_playwright() as p:
+                browser = None
                 try:
-                    browser = p.chromium.launch(
-                        headless=True,
-                        proxy={
-                            "server": f"http://{PROXY_HOST}:{PROXY_PORT}",
-                            "username": PROXY_USER,
-                            "password": PROXY_PASS
-                        },
-                        args=launch_args
-                    )
-                except Exception as e:
-                    if "executable doesn't exist" in str(e).lower():
-                        print("[INFO] Installing Playwright Chromium dependencies...")
-                        subprocess.run(["playwright", "install", "chromium"], check=True)
-                        browser = p.chromium.launch(headless=True, proxy={"server": proxy_server}, args=launch_args)
+                    launch_args = ["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage", "--disable-gpu"]
+                    try:
+                        browser = p.chromium.launch(
+                            headless=True,
+                            proxy={
+                                "server": f"http://{PROXY_HOST}:{PROXY_PORT}",
+                                "username": PROXY_USER,
+                                "password": PROXY_PASS
+                            },
+                            args=launch_args
+                        )
+                    except Exception as e:
+                        if "executable doesn't exist" in str(e).lower():
+                            print("[INFO] Installing Playwright Chromium dependencies...")
+                            subprocess.run(["playwright", "install", "chromium"], check=True)
+                            browser = p.chromium.launch(headless=True, proxy={"server": proxy_server}, args=launch_args)
+                        else:
+                            raise e
+
+                    context = browser.new_context(user_agent=ua, viewport={'width': 1920, 'height': 1080})
+                    page = context.new_page()
+
+                    response = page.goto(url, wait_until="load", timeout=60000)
+                    if response and response.status < 400:
+                        # Allow dynamic content to load
+                        page.wait_for_timeout(5000)
+
+                        # Search specifically for the Moat Score table row
+                        row = page.locator("tr").filter(has_text=re.compile(r"Moat Score", re.IGNORECASE)).first
+                        row_found = row.count() > 0
+                        scraped = {"text": row.inner_text() if row_found else page.content(), "row_found": row_found}
+                        browser.close()
+                        return scraped
                     else:
-                        raise e
-
-                context = browser.new_context(user_agent=ua, viewport={'width': 1920, 'height': 1080})
-                page = context.new_page()
+                        status = response.status if response else "No Response"
+                        print(f"[WARN] Page load issues (Status: {status}).")
 
-                response = page.goto(url, wait_until="load", timeout=60000)
-                if response and response.status < 400:
-                    # Allow dynamic content to load
-                    page.wait_for_timeout(5000)
-
-                    # Search specifically for the Moat Score table row
-                    row = page.locator("tr").filter(has_text=re.compile(r"Moat Score", re.IGNORECASE)).first
-                    raw_val = row.inner_text() if row.count() > 0 else page.content()
-
-                    digit_match = re.search(r"Moat Score.*?(\d+)", raw_val, re.IGNORECASE | re.DOTALL)
-                    if not digit_match and row.count() > 0:
-                        digit_match = re.search(r"(\d+)", raw_val)
-
-                    if digit_match:
-                        result = digit_match.group(1)
-                        print(f"[SUCCESS] Obtained score via scraping for {ticker}: {result}")
+                    browser.close()
+                except Exception as e:
+                    print(f"[ERROR] Playwright failure on attempt {attempt}: {e}")
+                    if browser:
                         browser.close()
-                        return result
-                else:
-                    status = response.status if response else "No Response"
-                    print(f"[WARN] Page load issues (Status: {status}).")
 
-                browser.close()
-            except Exception as e:
-                print(f"[ERROR] Playwright failure on attempt {attempt}: {e}")
-                if browser:
-                    browser.close()
+            time.sleep(2)
+        return None
+
+    scraped = snapshots.capture(ticker, "moat", "gurufocus_page", scrape_moat_row)
+    if scraped:
+        raw_val = scraped["text"]
+        digit_match = re.search(r"Moat Score.*?(\d+)", raw_val, re.IGNORECASE | re.DOTALL)
+        if not digit_match and scraped["row_found"]:
+            digit_match = re.search(r"(\d+)", raw_val)
 
-        time.sleep(2)
+        if digit_match:
+            result = digit_match.group(1)
+            print(f"[SUCCESS] Obtained score via scraping for {ticker}: {result}")
+            return metric(result, "score", "GuruFocus")
 
     print(f"[INFO] Scraping failed for {ticker}. Escalating to Tier 3 (Gemini LLM)...")
 
@@ -167,32 +160,37 @@ def get_moat_score(ticker: str):
         "tools": [{"google_search": {}}]
     }
 
-    for i in range(5):
-        try:
-            resp = requests.post(api_url, json=payload, timeout=30)
-            if resp.status_code == 200:
-                resp_json = resp.json()
-                text = resp_json.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', 'N/A')
-
-                # Extract digits from LLM response
-                match = re.search(r"(\d+)", text)
-                if match:
-                    result = match.group(1)
-                    print(f"[SUCCESS] This value is get by gemini for {ticker}: {result}")
-                    return result
-                break
-            elif resp.status_code == 429:
-                print(f"[WARN] Gemini API Rate Limited. Backing off...")
+    def ask_gemini():
+        """The Gemini response JSON, or None."""
+        for i in range(5):
+            try:
+                resp = requests.post(api_url, json=payload, timeout=30)
+                if resp.status_code == 200:
+                    return resp.json()
+                elif resp.status_code == 429:
+                    print(f"[WARN] Gemini API Rate Limited. Backing off...")
+                    time.sleep(2 ** i)
+                else:
+                    print(f"[ERROR] Gemini API returned status {resp.status_code}")
+                    return None
+            except Exception as api_err:
+                print(f"[ERROR] API request error: {api_err}")
                 time.sleep(2 ** i)
-            else:
-                print(f"[ERROR] Gemini API returned status {resp.status_code}")
-                break
-        except Exception as api_err:
-            print(f"[ERROR] API request error: {api_err}")
-            time.sleep(2 ** i)
+        return None
+
+    resp_json = snapshots.capture(ticker, "moat", "gemini", ask_gemini)
+    if resp_json:
+        text = resp_json.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', 'N/A')
+
+        # Extract digits from LLM response
+        match = re.search(r"(\d+)", text)
+        if match:
+            result = match.group(1)
+            print(f"[SUCCESS] This value is get by gemini for {ticker}: {result}")
+            return metric(result, "score", "Gemini (GuruFocus)")
 
     print(f"[FINAL] All methods exhausted for {ticker}. Returning N/A.")
-    return "N/A"
+    return metric(None, "score", "GuruFocus")
 
 
 if __name__ == "__main__":
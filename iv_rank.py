@@ -8,9 +8,15 @@ from playwright.sync_api import sync_playwright
 import json
 import streamlit as st
 
+import snapshots
+from metrics import metric
+
+IV_RANK_PATTERN = r"IV Rank\s*[:]?\s*([\d\.]+)%?"
+
 
 
 def get_iv_rank_advanced(ticker):
+    """Returns the IV Rank as a MetricRecord (Unusual Whales, then Gemini search as fallback)."""
     ticker = ticker.upper().strip()
     unusual_whales_url = f"https://unusualwhales.com/stock/{ticker}/volatility"
 
@@ -24,71 +30,83 @@ def get_iv_rank_advanced(ticker):
     # ---------------------------------------------------------
     # ATTEMPT 1 : Unusual Whales (1 Try)
     # ---------------------------------------------------------
-    for try_num in range(1, 2):
-        sys.stderr.write(f"INFO: Attempt {try_num} - Unusual Whales via dataimpulse")
-        with sync_playwright() as p:
-            try:
-                # Launch browser
-                browser = p.chromium.launch(
-                    headless=True,
-                    proxy=proxy_config,
-                    args=[
-                        "--no-sandbox",
-                        "--disable-dev-shm-usage",
-                        "--ignore-certificate-errors"
-                    ]
-                )
-
-                context = browser.new_context(
-                    user_agent=user_agent,
-                    ignore_https_errors=True
-                )
-                page = context.new_page()
-
-                # Step 1: Verify Proxy IP
-                sys.stderr.write(f"DEBUG: Try {try_num} - Verifying Proxy Connection... ")
+    def scrape_unusual_whales():
+        """
+        {"text", "element"}: the page fragment around "IV Rank", or the text of the element showing it
+        ("element": True), or None.
+        """
+        for try_num in range(1, 2):
+            sys.stderr.write(f"INFO: Attempt {try_num} - Unusual Whales via dataimpulse")
+            with sync_playwright() as p:
                 try:
-                    page.goto("https://httpbin.org/ip", timeout=30000)
-                    sys.stderr.write("SUCCESS!\n")
-                except Exception as e:
-                    sys.stderr.write(f"FAILED (Proxy Handshake). Error: {str(e)}\n")
-                    browser.close()
-                    continue  # Try the next attempt
-
-                # Step 2: Navigate and Extract
-                sys.stderr.write(f"INFO: Navigating to Unusual Whales for {ticker}...\n")
-                page.goto(unusual_whales_url, wait_until="load", timeout=timeout_ms)
-
-                iv_rank = None
-                # Polling for dynamic JS content
-                for _ in range(20):
-                    content = page.content()
-                    # Regex logic for "IV Rank"
-                    match = re.search(r"IV Rank\s*[:]?\s*([\d\.]+)%?", content, re.IGNORECASE)
-                    if match:
-                        iv_rank = match.group(1)
-                        break
+                    # Launch browser
+                    browser = p.chromium.launch(
+                        headless=True,
+                        proxy=proxy_config,
+                        args=[
+                            "--no-sandbox",
+                            "--disable-dev-shm-usage",
+                            "--ignore-certificate-errors"
+                        ]
+                    )
 
+                    context = browser.new_context(
+                        user_agent=user_agent,
+                        ignore_https_errors=True
+                    )
+                    page = context.new_page()
 
+                    # Step 1: Verify Proxy IP
+                    sys.stderr.write(f"DEBUG: Try {try_num} - Verifying Proxy Connection... ")
                     try:
-                        iv_locator = page.get_by_text("IV Rank", exact=False).first
-                        if iv_locator.is_visible():
-                            parent_text = iv_locator.evaluate("el => el.closest('div').innerText")
-                            val_match = re.search(r"(\d+\.\d+|\d+)", parent_text)
-                            if val_match:
-                                iv_rank = val_match.group(1)
-                                break
-                    except:
-                        pass
-                    page.wait_for_timeout(2000)
-
-                if iv_rank:
+                        page.goto("https://httpbin.org/ip", timeout=30000)
+                        sys.stderr.write("SUCCESS!\n")
+                    except Exception as e:
+                        sys.stderr.write(f"FAILED (Proxy Handshake). Error: {str(e)}\n")
+                        browser.close()
+                        continue  # Try the next attempt
+
+                    # Step 2: Navigate and Extract
+                    sys.stderr.write(f"INFO: Navigating to Unusual Whales for {ticker}...\n")
+                    page.goto(unusual_whales_url, wait_until="load", timeout=timeout_ms)
+
+                    scraped = None
+                    # Polling for dynamic JS content
+                    for _ in range(20):
+                        content = page.content()
+                        # Regex logic for "IV Rank"
+                        match = re.search(IV_RANK_PATTERN, content, re.IGNORECASE)
+                        if match:
+                            scraped = {"text": content[max(0, match.start() - 200):match.end() + 200], "element": False}
+                            break
+
+
+                        try:
+                            iv_locator = page.get_by_text("IV Rank", exact=False).first
+                            if iv_locator.is_visible():
+                                parent_text = iv_locator.evaluate("el => el.closest('div').innerText")
+                                if re.search(r"(\d+\.\d+|\d+)", parent_text):
+                                    scraped = {"text": parent_text, "element": True}
+                                    break
+                        except:
+                            pass
+                        page.wait_for_timeout(2000)
+
                     browser.close()
-                    return f"Success! The IV Rank for {ticker} is: {iv_rank}"
+                    if scraped:
+                        return scraped
+                except Exception as e:
+                    sys.stderr.write(f"ERROR: Attempt {try_num} Failed: {str(e)}\n")
+        return None
 
-                browser.close()
-            except Exception as e:
-                sys.stderr.write(f"ERROR: Attempt {try_num} Failed: {str(e)}\n")
+    scraped = snapshots.capture(ticker, "iv_rank", "unusual_whales", scrape_unusual_whales)
+    if scraped:
+        if scraped["element"]:
+            val_match = re.search(r"(\d+\.\d+|\d+)", scraped["text"])
+        else:
+            val_match = re.search(IV_RANK_PATTERN, scraped["text"], re.IGNORECASE)
+        if val_match:
+            return metric(val_match.group(1), "number", "Unusual Whales")
 
     #
     sys.stderr.write(f"INFO: Final Fallback - Gemini Search for optionscharts.io data\n")
@@ -130,9 +148,7 @@ def get_iv_rank_advanced(ticker):
             try:
                 response = requests.post(url, json=payload, timeout=30)
                 if response.status_code == 200:
-                    result = response.json()
-                    text = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-                    return text
+                    return response.json()
                 elif response.status_code == 429:  # Rate limit
                     time.sleep(delay)
                 else:
@@ -143,15 +159,18 @@ def get_iv_rank_advanced(ticker):
 
 
     search_query = f"What is the current IV Rank for ticker {ticker}? Check optionscharts.io specifically."
-    gemini_res = call_gemini_with_search(search_query)
+    result = snapshots.capture(ticker, "iv_rank", "gemini", lambda: call_gemini_with_search(search_query))
+    gemini_res = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '') \
+        if result else None
 
     if gemini_res and "NOT_FOUND" not in gemini_res.upper():
         # Extract the numerical value from the Gemini response
         val_match = re.search(r"(\d+\.\d+|\d+)", gemini_res)
         if val_match:
-            return f"Success! The IV Rank for {ticker} is: {val_match.group(1)}"
+            return metric(val_match.group(1), "number", "Gemini (optionscharts.io)")
 
-    return f"Could not find IV Rank for {ticker} after all attempts (Unusual Whales and Gemini Search)."
+    sys.stderr.write(f"INFO: Could not find IV Rank for {ticker} after all attempts (Unusual Whales and Gemini Search).\n")
+    return metric(None, "number", "Unusual Whales")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+
+QUEUE_PATH = os.path.join(os.environ.get("LEAPS_CACHE_DIR", ".cache"), "jobs.sqlite3")
+LEASE_SECONDS = 300  # a claimed job returns to the queue if its worker stops renewing the lease
+MAX_ATTEMPTS = 3
+WORKER_TIMEOUT = 30  # seconds without a heartbeat before a worker counts as gone
+DEDUPE_WINDOW = 15 * 60  # a finished analysis is shared with identical requests for this long
+SAVE_RETRY_INTERVAL = 60  # seconds before an idle worker retries the save of a finished job
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    saved_at REAL,
+    save_attempted_at REAL,
+    save_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+CREATE INDEX IF NOT EXISTS jobs_ticker ON jobs (ticker, status);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+"""
+
+
+def connect(path=None):
+    """Opens the queue database (WAL mode, so the app can poll while workers write)."""
+    path = path or QUEUE_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    _add_save_columns(conn)
+    return conn
+
+
+def _add_save_columns(conn):
+    """Queues created before workers saved their results: jobs finished back then count as saved."""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+    if "saved_at" in columns:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "saved_at" not in columns:
+            for column in ("saved_at REAL", "save_attempted_at REAL", "save_error TEXT"):
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+            conn.execute("UPDATE jobs SET saved_at = updated_at WHERE status = 'done'")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _job_dict(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["params"] = json.loads(job["params"] or "{}")
+    return job
+
+
+def enqueue(conn, ticker, window=DEDUPE_WINDOW, **params):
+    """
+    Adds an analysis job and returns its id.
+    Single flight across processes: if the same ticker with the same params is already queued or
+    running, or finished less than `window` seconds ago, that job's id is returned instead.
+    """
+    now = time.time()
+    params_json = json.dumps(params, sort_keys=True)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT id FROM jobs WHERE ticker = ? AND params = ? "
+                           "AND (status IN ('queued', 'running') OR (status = 'done' AND updated_at >= ?)) "
+                           "ORDER BY id DESC LIMIT 1", (ticker, params_json, now - window)).fetchone()
+        if row is not None:
+            job_id = row["id"]
+            logger.info(f"Attaching {ticker} request to job {job_id}")
+        else:
+            job_id = conn.execute("INSERT INTO jobs (ticker, params, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                                  (ticker, params_json, now, now)).lastrowid
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return job_id
+
+
+def enqueue_batch(conn, tickers, checkpoint, **params):
+    """Adds a job screening a whole watchlist (resumable from `checkpoint`); same single flight as enqueue."""
+    return enqueue(conn, f"batch of {len(tickers)}", tickers=list(tickers), checkpoint=checkpoint, **params)
+
+
+def is_batch(job):
+    return "tickers" in job["params"]
+
+
+def get_job(conn, job_id):
+    return _job_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+def claim(conn, worker_id, lease_seconds=LEASE_SECONDS):
+    """
+    Atomically claims the oldest queued job, or a running job whose lease expired.
+    Jobs that already used MAX_ATTEMPTS are failed instead of being handed out again.
+    Returns the job dict or None.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("UPDATE jobs SET status = 'failed', error = 'lease expired after max attempts', "
+                     "lease_owner = NULL, updated_at = ? "
+                     "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?", (now, now, MAX_ATTEMPTS))
+        row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?) "
+                           "ORDER BY id LIMIT 1", (now,)).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                     "lease_expires = ?, updated_at = ? WHERE id = ?",
+                     (worker_id, now + lease_seconds, now, row["id"]))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return get_job(conn, row["id"])
+
+
+def renew_lease(conn, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+    """Extends the lease; returns False if the job is no longer held by this worker."""
+    now = time.time()
+    cur = conn.execute("UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                       "WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                       (now + lease_seconds, now, job_id, worker_id))
+    return cur.rowcount == 1
+
+
+def complete(conn, job_id, worker_id, result):
+    cur = conn.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_owner = NULL, "
+                       "updated_at = ? WHERE id = ? AND lease_owner = ?",
+                       (result, time.time(), job_id, worker_id))
+    return cur.rowcount == 1
+
+
+def fail(conn, job_id, worker_id, error, retry=True):
+    """Returns the job to the queue, or marks it failed once it used MAX_ATTEMPTS (or right away if not `retry`)."""
+    max_attempts = MAX_ATTEMPTS if retry else 0
+    cur = conn.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                       "error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                       "WHERE id = ? AND lease_owner = ?",
+                       (max_attempts, str(error), time.time(), job_id, worker_id))
+    return cur.rowcount == 1
+
+
+# --- Saving finished jobs ---
+# Workers save each analysis right after completing its job; a failed save (or one lost with its
+# worker) is retried by an idle worker. The history load job id keeps retries from appending twice.
+def save_started(conn, job_id):
+    conn.execute("UPDATE jobs SET save_attempted_at = ? WHERE id = ?", (time.time(), job_id))
+
+
+def mark_saved(conn, job_id):
+    conn.execute("UPDATE jobs SET saved_at = ?, save_error = NULL WHERE id = ?", (time.time(), job_id))
+
+
+def save_failed(conn, job_id, error):
+    conn.execute("UPDATE jobs SET save_error = ? WHERE id = ?", (str(error), job_id))
+
+
+def claim_unsaved(conn, retry_after=SAVE_RETRY_INTERVAL):
+    """
+    Atomically claims a finished job whose result is not saved and whose last save attempt (or, if
+    none was made, its completion) is older than `retry_after` seconds. Returns the job dict or None.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT id FROM jobs WHERE status = 'done' AND saved_at IS NULL "
+                           "AND COALESCE(save_attempted_at, updated_at) < ? ORDER BY id LIMIT 1",
+                           (now - retry_after,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE jobs SET save_attempted_at = ? WHERE id = ?", (now, row["id"]))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return None if row is None else get_job(conn, row["id"])
+
+
+def worker_heartbeat(conn, worker_id):
+    conn.execute("INSERT INTO workers (worker_id, last_seen) VALUES (?, ?) "
+                 "ON CONFLICT (worker_id) DO UPDATE SET last_seen = excluded.last_seen", (worker_id, time.time()))
+
+
+def worker_exit(conn, worker_id):
+    conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+
+def active_workers(conn, timeout=WORKER_TIMEOUT):
+    return [r["worker_id"] for r in
+            conn.execute("SELECT worker_id FROM workers WHERE last_seen >= ?", (time.time() - timeout,))]
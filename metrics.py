@@ -0,0 +1,132 @@
+import math
+import re
+import json
+import datetime
+from dataclasses import dataclass, asdict
+
+import snapshots
+
+
+# Units whose value is text rather than a number
+NON_NUMERIC_UNITS = ("date", "category", "text")
+# Unit of every report metric: placeholders for missing metrics and revived stored values use it
+METRIC_UNITS = {
+    "Current stock price": "price", "Market cap": "usd", "Shares Outstanding": "count",
+    "52 week low": "price", "52 weeks high": "price", "latest expiration date": "date",
+    "Total insider ownership %": "percent", "Total Assets": "usd", "Total Liabilities": "usd",
+    "Assets / Liabilities Ratio": "ratio", "Runway": "months", "Net Debt": "usd", "EBITDA": "usd",
+    "Net Debt / EBITDA": "ratio", "Cash Burn Severity": "percent", "Share Count Growth": "percent",
+    "Degree of Operating Leverage": "ratio", "Capital Structure Pressure": "category",
+    "Net Insider Buying vs Selling (%)": "percent", "Net Insider Activity": "category",
+    "Institutional Ownership (%)": "percent", "Short Float (%)": "percent",
+    "GuruFocus Moat Score": "score", "Forward EPS Growth (%)": "percent", "IV Rank": "number",
+    "CEO Ownership %": "percent", "Business Model & Value Proposition": "category",
+}
+
+# Notes of placeholder records for metrics that were never obtained; a refresh always fetches these again
+SKIPPED_NOTE = "Skipped"  # the node was pruned (early rejection)
+FAILED_NOTE = "Fetch failed"  # the node raised or returned nothing
+
+
+@dataclass(frozen=True)
+class MetricRecord:
+    """
+    A single fetched metric. `value` is a float for numeric units and a string for
+    'date' / 'category' units; None means the metric could not be obtained.
+    Percent values are stored in percent points (12.5 means 12.5%).
+    """
+    value: object = None
+    unit: str = "number"
+    source: str = ""
+    as_of: str = None
+    note: str = None
+
+
+def metric(value, unit, source, as_of=None, note=None):
+    """Builds a MetricRecord, normalizing NaN and numpy scalars to plain Python values."""
+    if value is not None and unit not in NON_NUMERIC_UNITS:
+        try:
+            value = float(value)
+            if math.isnan(value):
+                value = None
+        except (TypeError, ValueError):
+            value = None
+    if as_of is None:
+        as_of = snapshots.today().isoformat()  # the replay date while replaying
+    elif isinstance(as_of, (datetime.date, datetime.datetime)):
+        as_of = as_of.strftime("%Y-%m-%d")
+    return MetricRecord(value=value, unit=unit, source=source, as_of=as_of, note=note)
+
+
+def parse_number(text):
+    """Parses a scraped numeric string such as '12.5%' or '-3.1' once, at the fetch boundary."""
+    if text is None:
+        return None
+    match = re.search(r"-?\d+(?:\.\d+)?", str(text).replace(",", ""))
+    return float(match.group(0)) if match else None
+
+
+def format_large_number(num):
+    """
+    Converts numbers to strings in Millions, Billions, or Trillions.
+    """
+    if num is None or not isinstance(num, (int, float)):
+        return "N/A"
+
+    abs_num = abs(num)
+    if abs_num >= 1_000_000_000_000:
+        return f"{num / 1_000_000_000_000:.2f} Trillion"
+    elif abs_num >= 1_000_000_000:
+        return f"{num / 1_000_000_000:.2f} Billion"
+    elif abs_num >= 1_000_000:
+        return f"{num / 1_000_000:.2f} Million"
+    else:
+        return f"{num:.2f}"
+
+
+def format_metric(record):
+    """Render-time formatting of a MetricRecord (or a legacy plain value) for display."""
+    if not isinstance(record, MetricRecord):
+        return "N/A" if record is None else str(record)
+    value = record.value
+    if value is None:
+        return record.note or "N/A"
+
+    unit = record.unit
+    if unit in ("usd", "count"):
+        text = format_large_number(value)
+    elif unit == "months":
+        text = "Positive OCF (No Burn)" if math.isinf(value) else f"{value:.2f} Months"
+    elif unit == "percent":
+        text = f"{value:.2f}%"
+    elif unit in ("price", "ratio"):
+        text = f"{value:.2f}"
+    elif unit in ("score", "number"):
+        text = f"{value:g}"
+    else:
+        text = str(value)
+
+    if record.note:
+        text = f"{text} ({record.note})"
+    return text
+
+
+def _encode(obj):
+    if isinstance(obj, MetricRecord):
+        return {"__metric__": asdict(obj)}
+    if hasattr(obj, "item"):  # numpy scalars
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _decode(obj):
+    return MetricRecord(**obj["__metric__"]) if "__metric__" in obj else obj
+
+
+def to_json(data, sort_keys=False):
+    """JSON-encodes report data; MetricRecords survive the round trip through from_json."""
+    return json.dumps(data, default=_encode, sort_keys=sort_keys)
+
+
+def from_json(text):
+    return json.loads(text, object_hook=_decode)
@@ -0,0 +1,113 @@
+import argparse
+import datetime
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+import mirror
+from bq_client import get_client
+from storage import (dataset_path, table_path, ticker_table_name, parse_stored_values, ensure_history_table,
+                     append_history, MASTER_TABLE_NAME, HISTORY_TABLE_NAME, NARRATIVE_ROWS, FILING_PERIOD_ROW,
+                     HISTORY_COLUMNS, LEGACY_MISSING_TEXT)
+from metrics import NON_NUMERIC_UNITS, METRIC_UNITS
+
+# BigQuery limits the number of tables a single query may reference
+MAX_TABLES_PER_QUERY = 1000
+TEXT_ROWS = ["Risks", "Rewards", *NARRATIVE_ROWS, FILING_PERIOD_ROW]
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def load_legacy_tables(client, skip_tickers=()):
+    """
+    Reads every per-ticker detail table listed in master_table, with UNION ALL queries
+    (one job per MAX_TABLES_PER_QUERY tables), except those of `skip_tickers`.
+    Returns (master, rows): master lists every legacy table, rows only those that were read.
+    """
+    master = client.query(f"SELECT Ticker, date FROM `{table_path(client, MASTER_TABLE_NAME)}`").to_dataframe()
+    if master.empty:
+        return master, pd.DataFrame()
+    master["table_name"] = master["Ticker"].map(ticker_table_name)
+    existing = {t.table_id for t in client.list_tables(dataset_path(client))}
+    master = master[master["table_name"].isin(existing)].drop_duplicates("Ticker")
+
+    parts = []
+    table_names = list(master.loc[~master["Ticker"].isin(skip_tickers), "table_name"])
+    for start in range(0, len(table_names), MAX_TABLES_PER_QUERY):
+        chunk = table_names[start:start + MAX_TABLES_PER_QUERY]
+        union_sql = "\nUNION ALL\n".join(
+            f"SELECT '{name}' AS table_name, `Matric name` AS metric, Source AS source, Value AS raw_value, "
+            f"`Obtained Score` AS obtained, `Total score` AS total, LLM AS llm FROM `{table_path(client, name)}`"
+            for name in chunk)
+        parts.append(client.query(union_sql).to_dataframe())
+    rows = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    return master, rows
+
+
+def legacy_history_rows(master, rows):
+    """Converts the legacy string rows into typed history rows, one analysis per ticker."""
+    rows = rows.merge(master, on="table_name")
+    rows["ticker"] = rows["Ticker"]
+    rows["analysis_date"] = pd.to_datetime(rows["date"].astype(str).str[:10]).dt.date
+    rows["analysis_id"] = "legacy-" + rows["ticker"] + "-" + rows["analysis_date"].astype(str)
+    rows["saved_at"] = pd.to_datetime(rows["analysis_date"]).dt.tz_localize(datetime.timezone.utc)
+
+    metric_rows = rows[rows["metric"].isin(METRIC_UNITS.keys())].copy()
+    metric_rows["unit"] = metric_rows["metric"].map(METRIC_UNITS)
+    metric_rows["value_text"] = None
+    metric_rows["value"] = np.nan
+    for name, group in metric_rows.groupby("metric"):
+        if METRIC_UNITS[name] in NON_NUMERIC_UNITS:
+            texts = group["raw_value"].astype("string").str.strip()
+            texts = texts.mask(texts.str.lower().isin(LEGACY_MISSING_TEXT))
+            metric_rows.loc[group.index, "value_text"] = texts.astype(object).where(texts.notna(), None)
+        else:
+            metric_rows.loc[group.index, "value"] = parse_stored_values(name, group["raw_value"]).to_numpy()
+    obtained = metric_rows["obtained"].astype("string").str.strip().str.lower()
+    metric_rows["rejected"] = (obtained == "rejected").fillna(False).astype(bool)
+    metric_rows["obtained_points"] = pd.to_numeric(obtained, errors="coerce").astype("float64").mask(metric_rows["rejected"], 0.0)
+    metric_rows["total_points"] = pd.to_numeric(metric_rows["total"], errors="coerce").astype("float64").fillna(0.0)
+    metric_rows["as_of"] = metric_rows["analysis_date"]
+    metric_rows["note"] = None
+
+    text_rows = rows[rows["metric"].isin(TEXT_ROWS)].copy()
+    text_rows["unit"] = "text"
+    text_rows["value_text"] = text_rows["llm"].where(text_rows["llm"].notna(), None)
+    return pd.concat([metric_rows, text_rows], ignore_index=True).reindex(columns=HISTORY_COLUMNS)
+
+
+def migrate(drop_legacy=False):
+    """
+    Copies every legacy per-ticker table into the history table; optionally drops the old tables.
+    Safe to re-run: tickers that already have history are skipped, and the load job id is derived
+    from the migrated analyses, so a repeated load of the same rows is refused.
+    """
+    client = get_client()
+    if client is None:
+        raise RuntimeError("BigQuery client could not be created")
+    ensure_history_table(client)
+    migrated = set(client.query(f"SELECT DISTINCT ticker FROM `{table_path(client, HISTORY_TABLE_NAME)}`")
+                   .to_dataframe()["ticker"])
+    master, rows = load_legacy_tables(client, skip_tickers=migrated)
+    history = legacy_history_rows(master, rows) if not rows.empty else pd.DataFrame()
+    if history.empty:
+        logging.info("No legacy ticker tables left to migrate.")
+    else:
+        ids = ",".join(sorted(history["analysis_id"].unique()))
+        append_history(client, history, job_id=f"migrate_history_{hashlib.sha1(ids.encode()).hexdigest()}")
+        logging.info(f"Migrated {history['ticker'].nunique()} tickers ({len(history)} rows) into the history table.")
+        mirror.sync(full=True)
+    if drop_legacy and not master.empty:
+        for name in master["table_name"]:
+            client.delete_table(table_path(client, name), not_found_ok=True)
+        logging.info(f"Dropped {len(master)} legacy ticker tables.")
+    return 0 if history.empty else history["ticker"].nunique()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move the per-ticker analysis tables into the history table.")
+    parser.add_argument("--drop-legacy", action="store_true", help="Delete the per-ticker tables afterwards.")
+    args = parser.parse_args()
+    migrate(drop_legacy=args.drop_legacy)
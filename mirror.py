@@ -0,0 +1,165 @@
+import os
+import time
+import logging
+import datetime
+import threading
+
+import pandas as pd
+from google.cloud import bigquery
+
+from bq_client import DuckDBClient, get_client, read_arrow, arrow_frame
+from storage import (ensure_history_table, table_path, MASTER_TABLE_NAME, HISTORY_TABLE_NAME, MASTER_SCHEMA,
+                     HISTORY_SCHEMA)
+
+# Local DuckDB copy of master_table and the analysis history that the UI reads from.
+# BigQuery stays the system of record: writes go there first and are applied here as well.
+MIRROR_PATH = os.path.join(os.environ.get("LEAPS_CACHE_DIR", ".cache"), "mirror.duckdb")
+SYNC_INTERVAL = 60.0  # seconds before a read triggers a background sync
+SYNC_OVERLAP_DAYS = 1  # history days re-read on every sync, for loads that landed after the last one
+# "1": never contact BigQuery, serve the mirror as it is (offline development and benchmarks)
+OFFLINE = os.environ.get("LEAPS_MIRROR_OFFLINE") == "1"
+
+logger = logging.getLogger(__name__)
+
+_mirror = None
+_mirror_lock = threading.Lock()
+_sync_lock = threading.Lock()
+_state = {"last_sync": 0.0, "generation": 0, "versions": {}}
+
+
+def get_mirror():
+    """The process-wide mirror database (a DuckDBClient, so the storage read functions run on it unchanged)."""
+    global _mirror
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                mirror = DuckDBClient(MIRROR_PATH)
+                ensure_history_table(mirror)
+                _mirror = mirror
+    return _mirror
+
+
+def generation():
+    """Counts completed syncs; cached reads of the mirror are keyed by it."""
+    return _state["generation"]
+
+
+def ticker_version(ticker):
+    """Counts the syncs that brought in changed rows of the ticker; its cached detail reads are keyed by it."""
+    return _state["versions"].get(ticker, 0)
+
+
+def history_watermark(mirror):
+    """The latest analysis date in the mirror, or None when it is empty."""
+    rows = mirror.query(f"SELECT MAX(analysis_date) AS watermark FROM `{table_path(mirror, HISTORY_TABLE_NAME)}`") \
+        .to_dataframe()
+    watermark = rows["watermark"].iloc[0]
+    return pd.Timestamp(watermark).date() if pd.notna(watermark) else None
+
+
+def master_frame(client):
+    """master_table as a frame; older master tables store the date as text, so it is parsed."""
+    master = arrow_frame(read_arrow(client, f"SELECT {', '.join(f.name for f in MASTER_SCHEMA)} "
+                                            f"FROM `{table_path(client, MASTER_TABLE_NAME)}`"))
+    master["date"] = pd.to_datetime(master["date"].astype(str).str[:10], errors="coerce").dt.date
+    return master
+
+
+def changed_tickers(old, new):
+    """Tickers whose master_table row was added, removed or changed between two reads of it."""
+    old, new = (frame.drop_duplicates("Ticker").set_index("Ticker").astype(str) for frame in (old, new))
+    index = old.index.union(new.index)
+    return list(index[(old.reindex(index) != new.reindex(index)).any(axis=1)])
+
+
+def sync(full=False):
+    """
+    Pulls BigQuery into the mirror: master_table in full (it is small, and rescores and deletes change
+    old rows), the history from the date watermark on (minus SYNC_OVERLAP_DAYS), or all of it if `full`.
+    Tickers whose master row changed get their whole history re-read: rescores restate the points of
+    older rows and migrations backfill analyses from before the watermark.
+    History rows of tickers no longer in master_table are dropped. Returns False when BigQuery
+    cannot be reached; the mirror then keeps serving what it has.
+    """
+    client = None if OFFLINE else get_client()
+    if client is None:
+        return False
+    mirror = get_mirror()
+    with _sync_lock:
+        since = None if full else history_watermark(mirror)
+        if since is not None:
+            since -= datetime.timedelta(days=SYNC_OVERLAP_DAYS)
+        history_path = table_path(client, HISTORY_TABLE_NAME)
+        try:
+            ensure_history_table(client)
+            master = master_frame(client)
+            local = master_frame(mirror)
+            changed = [] if since is None else changed_tickers(local, master)
+            params, clauses = [], []
+            if since:
+                params.append(bigquery.ScalarQueryParameter("since", "DATE", since))
+                clauses.append("analysis_date >= @since")
+            if changed:
+                params.append(bigquery.ArrayQueryParameter("changed", "STRING", changed))
+                clauses.append("ticker IN UNNEST(@changed)")
+            where = f" WHERE {' OR '.join(clauses)}" if clauses else ""
+            history = arrow_frame(read_arrow(client, f"SELECT * FROM `{history_path}`{where}", params))
+        except Exception as e:
+            logger.warning(f"Mirror sync failed, serving the local copy: {e}")
+            _state["last_sync"] = time.time()
+            return False
+
+        local_master = table_path(mirror, MASTER_TABLE_NAME)
+        local_history = table_path(mirror, HISTORY_TABLE_NAME)
+        with mirror.transaction():
+            known = mirror.query(f"SELECT DISTINCT analysis_id FROM `{local_history}`{where}",
+                                 job_config=bigquery.QueryJobConfig(query_parameters=params)).to_dataframe()
+            mirror.query(f"DELETE FROM `{local_master}`")
+            mirror.load_table_from_dataframe(master, local_master, job_config=bigquery.LoadJobConfig(
+                schema=MASTER_SCHEMA, write_disposition="WRITE_APPEND"))
+            mirror.query(f"DELETE FROM `{local_history}`{where}",
+                         job_config=bigquery.QueryJobConfig(query_parameters=params))
+            mirror.load_table_from_dataframe(history, local_history, job_config=bigquery.LoadJobConfig(
+                schema=HISTORY_SCHEMA, write_disposition="WRITE_APPEND"))
+            mirror.query(f"DELETE FROM `{local_history}` WHERE ticker NOT IN (SELECT Ticker FROM `{local_master}`)")
+        # A full sync rewrites every ticker; otherwise only changed master rows and new analyses count
+        if since is None:
+            touched = {*local["Ticker"], *master["Ticker"]}
+        else:
+            touched = {*changed, *history.loc[~history["analysis_id"].isin(known["analysis_id"]), "ticker"]}
+        for ticker in touched:
+            _state["versions"][ticker] = ticker_version(ticker) + 1
+        _state["last_sync"] = time.time()
+        _state["generation"] += 1
+    logger.info(f"Mirror synced {len(master)} master rows and {len(history)} history rows"
+                + (f" since {since}" if since else "")
+                + (f" (full history of {len(changed)} changed tickers)" if changed else ""))
+    return True
+
+
+def maybe_sync():
+    """
+    Starts a background sync when the last one is older than SYNC_INTERVAL, so reads never wait on
+    BigQuery. Only the very first sync of an empty mirror blocks. Returns the mirror.
+    """
+    mirror = get_mirror()
+    if OFFLINE or time.time() - _state["last_sync"] < SYNC_INTERVAL or _sync_lock.locked():
+        return mirror
+    _state["last_sync"] = time.time()
+    if history_watermark(mirror) is None and generation() == 0:
+        sync()
+    else:
+        threading.Thread(target=sync, daemon=True).start()
+    return mirror
+
+
+def write_through(write, *args, **kwargs):
+    """
+    Applies a write that already succeeded on BigQuery to the mirror too (e.g. storage.append_history),
+    so the UI sees it before the next sync. A failure here is only logged: the next sync repairs it.
+    """
+    try:
+        write(get_mirror(), *args, **kwargs)
+        _state["generation"] += 1
+    except Exception as e:
+        logger.warning(f"Mirror write-through of {getattr(write, '__name__', write)} failed: {e}")
@@ -0,0 +1,156 @@
+import os
+import glob
+import json
+import uuid
+import hashlib
+import logging
+import threading
+
+import pandas as pd
+
+from metrics import to_json, from_json
+from storage import history_rows, append_history, upsert_master, upsert_master_rows, master_row
+
+SPOOL_DIR = os.path.join(os.environ.get("LEAPS_CACHE_DIR", ".cache"), "spool")
+FLUSH_SIZE = 50  # analyses per load job
+FLUSH_INTERVAL = 30.0  # seconds before a partial buffer is flushed anyway
+MAX_PENDING = 200  # add() blocks while this many analyses wait to be written
+
+logger = logging.getLogger(__name__)
+
+
+def history_frame(entries):
+    """History rows of several finished analyses ({"ticker", "report"} dicts)."""
+    frames = []
+    for entry in entries:
+        report = entry["report"]
+        frames.append(history_rows(entry["ticker"], report["report_rows"], report["risk_reward"],
+                                   report["llm_analysis"], report.get("filing_period"), report.get("analysis_id"),
+                                   report.get("content_hash")))
+    return pd.concat(frames, ignore_index=True)
+
+
+def master_rows(entries):
+    return [master_row(entry["ticker"], entry["report"]) for entry in entries]
+
+
+def save_analysis(client, ticker, report):
+    """
+    Saves one finished analysis: appends its history rows with a load job and upserts its master_table
+    row with one MERGE. The load job id is derived from the analysis id, so saving it twice appends once.
+    """
+    rows = history_frame([{"ticker": ticker, "report": report}])
+    job_id = f"history_{report['analysis_id']}" if report.get("analysis_id") else None
+    append_history(client, rows, job_id=job_id)
+    upsert_master(client, ticker, report)
+
+
+class PersistenceBuffer:
+    """
+    Collects finished analyses and writes them from a background thread, FLUSH_SIZE at a time or
+    every FLUSH_INTERVAL seconds. add() blocks while MAX_PENDING analyses are waiting (back-pressure).
+    A failed flush is spooled to a local JSONL file and replayed before the next flush, so no
+    analysis is lost when BigQuery is unavailable.
+
+        with PersistenceBuffer(client) as buffer:
+            buffer.add(ticker, report)
+    """
+
+    def __init__(self, client, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING,
+                 spool_dir=SPOOL_DIR):
+        self.client = client
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spool_dir = spool_dir
+        self._pending = []
+        self._closing = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, ticker, report):
+        with self._cond:
+            while len(self._pending) >= self.max_pending and not self._closing:
+                self._cond.wait()
+            self._pending.append({"ticker": ticker, "report": report})
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify_all()
+
+    def close(self):
+        """Flushes what is left and stops the writer thread."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closing and len(self._pending) < self.flush_size:
+                    self._cond.wait(self.flush_interval)
+                batch, self._pending = self._pending, []
+                closing = self._closing
+                self._cond.notify_all()
+            if batch or closing:
+                self._flush(batch)
+            if closing:
+                return
+
+    def _flush(self, batch):
+        if not self.replay_spool():
+            self._spool(batch)
+            return
+        if batch and self._write(batch):
+            logger.info(f"Saved {len(batch)} analyses to BigQuery.")
+
+    def _write(self, batch, loaded=False):
+        """
+        One load job into the history table, then one master_table MERGE. On failure the batch is
+        spooled with how far it got. The load job id is derived from the analysis ids only, so a
+        replay whose first load went through after all is recognised and not appended twice.
+        """
+        try:
+            if not loaded:
+                rows = history_frame(batch)
+                key = hashlib.sha256(",".join(sorted(rows["analysis_id"].unique())).encode()).hexdigest()[:32]
+                append_history(self.client, rows, job_id=f"history_batch_{key}")
+                loaded = True
+            upsert_master_rows(self.client, master_rows(batch))
+            return True
+        except Exception as e:
+            logger.error(f"Bulk save of {len(batch)} analyses failed, spooling them locally: {e}")
+            self._spool(batch, loaded)
+            return False
+
+    def _spool(self, batch, loaded=False):
+        if not batch:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"loaded": loaded}) + "\n")
+            for entry in batch:
+                f.write(to_json(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay_spool(self):
+        """Writes spooled batches, oldest first; returns False if one still fails (it is spooled again)."""
+        paths = sorted(glob.glob(os.path.join(self.spool_dir, "*.jsonl")), key=os.path.getmtime)
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                entries = [from_json(line) for line in f if line.strip()]
+            ok = not entries or self._write(entries, header["loaded"])
+            os.remove(path)  # a failed replay was spooled again by _write
+            if not ok:
+                return False
+            logger.info(f"Replayed {len(entries)} spooled analyses.")
+        return True
@@ -0,0 +1,436 @@
+import re
+import time
+import uuid
+import hashlib
+import asyncio
+import logging
+import threading
+import concurrent.futures
+
+import streamlit as st
+
+import snapshots
+
+from yahoo_finance import run_comprehensive_analysis, run_market_snapshot, latest_statement_period
+from finviz import scrape_finviz
+from gurufocus_moat import get_moat_score
+from EPS_growth import get_forward_eps_growth
+from iv_rank import get_iv_rank_advanced
+from simply_wall_street import scrape_risk_rewards, get_company_name
+from LLM import analyze_ticker
+from metrics import metric, parse_number, format_metric, to_json, METRIC_UNITS, SKIPPED_NOTE, FAILED_NOTE
+from freshness import is_fresh, narrative_is_fresh
+from scoring import (SCORING_SPEC, TOTAL_POINTS, frame_from_records, score_frame, summarize_scores, verdict_for,
+                     points_range, override_inputs)
+
+QUOTE_METRICS = ["Current stock price", "Market cap", "Shares Outstanding", "52 week low", "52 weeks high",
+                 "latest expiration date", "Total insider ownership %"]
+YAHOO_METRICS = QUOTE_METRICS + ["Total Assets", "Total Liabilities", "Assets / Liabilities Ratio", "Runway",
+                                 "Net Debt", "EBITDA", "Net Debt / EBITDA", "Cash Burn Severity",
+                                 "Share Count Growth", "Degree of Operating Leverage", "Capital Structure Pressure"]
+FINVIZ_METRICS = ["Net Insider Buying vs Selling (%)", "Net Insider Activity",
+                  "Institutional Ownership (%)", "Short Float (%)"]
+
+# Metrics produced by the expensive stage: name -> (unit, source) used for placeholders
+EXPENSIVE_METRICS = {
+    "GuruFocus Moat Score": ("score", "GuruFocus"),
+    "Forward EPS Growth (%)": ("percent", "Alpha Vantage"),
+    "IV Rank": ("number", "Unusual Whales"),
+    "CEO Ownership %": ("percent", "Perplexity"),
+    "Business Model & Value Proposition": ("category", "Perplexity"),
+}
+REPORT_METRICS = YAHOO_METRICS + FINVIZ_METRICS + list(EXPENSIVE_METRICS)
+
+# Result placeholder for nodes whose stored outputs are reused
+REUSED = object()
+
+# --- SINGLE FLIGHT ---
+# (ticker, full_report, stored date, replay state) -> {"future": concurrent Future, "done_at": completion time or None}.
+# concurrent futures (not asyncio ones) because callers run their own event loops in different threads.
+SINGLE_FLIGHT_WINDOW = 15 * 60
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def parse_llm_response(text):
+    data = {"description": "N/A", "value_proposition": "N/A", "moat": "N/A",
+            "ceo_ownership": metric(None, "percent", "Perplexity"),
+            "classification": metric(None, "category", "Perplexity")}
+    if not text or not isinstance(text, str): return data
+    desc_match = re.search(r"Company Description:\s*(.*?)(?=\n\n|\nValue Proposition:)", text, re.DOTALL)
+    if desc_match: data["description"] = desc_match.group(1).strip()
+    vp_match = re.search(r"Value Proposition:\s*(.*?)(?=\n\n|\nMoat Analysis:)", text, re.DOTALL)
+    if vp_match: data["value_proposition"] = vp_match.group(1).strip()
+    moat_match = re.search(r"Moat Analysis:\s*(.*?)(?=\n\n|\nCEO Ownership:)", text, re.DOTALL)
+    if moat_match: data["moat"] = moat_match.group(1).strip()
+    own_match = re.search(r"Ownership Percentage:\s*(.*?)(?=\nSource:|\n\n|\nFinal Classification:)", text,
+                          re.DOTALL)
+    if own_match:
+        own_text = own_match.group(1).strip()
+        own_pct = None if "not disclosed" in own_text.lower() else parse_number(own_text)
+        data["ceo_ownership"] = metric(own_pct, "percent", "Perplexity")
+    class_match = re.search(r"Category:\s*(.*?)(?=\nPoints:|\n\n|$)", text, re.DOTALL)
+    if class_match: data["classification"] = metric(class_match.group(1).strip(), "category", "Perplexity")
+    return data
+
+
+def _usable(result):
+    return result is not None and result is not REUSED and not isinstance(result, Exception)
+
+
+def _eps_growth(ticker):
+    return get_forward_eps_growth(ticker, st.secrets["ALPHA_VANTAGE_API_KEY_1"])
+
+
+# --- FETCH GRAPH ---
+# run: called as run(ticker, **inputs); inputs: nodes whose results are passed in by keyword;
+# after: nodes that must finish first (ordering only); metrics: scored metrics the node feeds;
+# optional: may be pruned once its metrics can no longer change the verdict;
+# narrative: report key of the text it also feeds, so it is only pruned once the ticker is rejected.
+# Shared inputs (nodes others take as `inputs`) are pruned with the last of their consumers, so the
+# Polygon lookup waits for the gates.
+# Alpha Vantage stays inside the "yahoo" node, which only queries it for Yahoo gaps.
+GATE_NODES = ["yahoo", "finviz"]
+FETCH_GRAPH = {
+    "company_name": {"run": get_company_name, "after": GATE_NODES},
+    "yahoo": {"run": run_comprehensive_analysis, "metrics": YAHOO_METRICS},
+    "finviz": {"run": scrape_finviz, "metrics": FINVIZ_METRICS},
+    "moat": {"run": get_moat_score, "after": GATE_NODES, "optional": True,
+             "metrics": ["GuruFocus Moat Score"]},
+    "iv_rank": {"run": get_iv_rank_advanced, "after": GATE_NODES, "optional": True, "metrics": ["IV Rank"]},
+    "eps_growth": {"run": _eps_growth, "after": GATE_NODES, "optional": True,
+                   "metrics": ["Forward EPS Growth (%)"]},
+    "llm": {"run": analyze_ticker, "inputs": ["company_name"], "after": GATE_NODES, "optional": True,
+            "narrative": "llm_analysis", "metrics": ["CEO Ownership %", "Business Model & Value Proposition"]},
+    "risk_rewards": {"run": scrape_risk_rewards, "inputs": ["company_name"], "after": GATE_NODES,
+                     "optional": True, "narrative": "risk_reward"},
+}
+# Replaces the "yahoo" node on refreshes where no new filing landed since the stored analysis
+MARKET_SNAPSHOT_NODE = {"run": run_market_snapshot, "metrics": QUOTE_METRICS}
+
+
+def collect_records(results):
+    """
+    Merges raw fetcher results into {metric name: MetricRecord}.
+    On a refresh the stored report (results["stored"]) is the base: reused nodes keep their stored
+    records and fetched nodes overwrite theirs. Metrics missing everywhere get a placeholder
+    ("Skipped" for skipped nodes, "Fetch failed" for failed ones).
+    Returns None when there are no fundamentals (Yahoo Finance failed and nothing is stored).
+    """
+    stored = results.get("stored") or {}
+    records = dict(stored.get("records", {}))
+    yahoo = results.get("yahoo")
+    if _usable(yahoo) and yahoo.get("status") == "success":
+        records.update(yahoo["data"]["Summary"])
+        if yahoo["data"].get("market_only"):
+            _rescale_cash_burn(records, stored.get("records", {}))
+    elif not any(name in records for name in YAHOO_METRICS):
+        return None
+
+    finviz_results = results.get("finviz")
+    if _usable(finviz_results):
+        for mk in FINVIZ_METRICS:
+            if mk in finviz_results:
+                records[mk] = finviz_results[mk]
+
+    llm = results.get("llm")
+    llm_parsed = parse_llm_response(llm) if _usable(llm) else {"ceo_ownership": llm, "classification": llm}
+    fetched = {
+        "GuruFocus Moat Score": results.get("moat"),
+        "Forward EPS Growth (%)": results.get("eps_growth"),
+        "IV Rank": results.get("iv_rank"),
+        "CEO Ownership %": llm_parsed["ceo_ownership"],
+        "Business Model & Value Proposition": llm_parsed["classification"],
+    }
+    skipped = {m for node in results.get("skipped", []) for m in FETCH_GRAPH[node].get("metrics", [])}
+    for name, record in fetched.items():
+        unit, source = EXPENSIVE_METRICS[name]
+        if _usable(record):
+            records[name] = record
+        elif name not in records:
+            records[name] = metric(None, unit, source, note=_missing_note(name, skipped, record))
+    # Scored metrics no fetcher delivered still score their missing points, so they get a row too
+    yahoo_ok = yahoo if _usable(yahoo) and yahoo.get("status") == "success" else None
+    for name in SCORING_SPEC:
+        if name not in records:
+            source, result = ("Finviz", finviz_results) if name in FINVIZ_METRICS else ("Yahoo Finance", yahoo_ok)
+            records[name] = metric(None, METRIC_UNITS[name], source, note=_missing_note(name, skipped, result))
+    return {name: records[name] for name in REPORT_METRICS if name in records}
+
+
+def _missing_note(name, skipped, result):
+    """Note of a placeholder record: why the metric was not obtained, or None when its source had no value."""
+    if name in skipped:
+        return SKIPPED_NOTE
+    if result is not REUSED and not _usable(result):
+        return FAILED_NOTE
+    return None
+
+
+def _rescale_cash_burn(records, stored_records):
+    """Cash Burn Severity is |TTM FCF| / market cap; without a new filing only the market cap moves."""
+    burn, old_cap, new_cap = (stored_records.get("Cash Burn Severity"), stored_records.get("Market cap"),
+                              records.get("Market cap"))
+    if burn and old_cap and new_cap and burn.value and old_cap.value and new_cap.value:
+        records["Cash Burn Severity"] = metric(burn.value * old_cap.value / new_cap.value, "percent", burn.source,
+                                               note=burn.note)
+
+
+def _narrative_stored(stored, key):
+    return any((isinstance(v, list) and v) or (isinstance(v, str) and v not in ("", "N/A"))
+               for v in (stored.get(key) or {}).values())
+
+
+def reusable_nodes(stored, graph=FETCH_GRAPH, today=None, filing_unchanged=False):
+    """
+    Nodes whose stored outputs are still fresh under the freshness policy, so a refresh reuses them
+    instead of fetching. A node is reusable when all of its stored metrics are fresh (at least one of
+    them stored) and its narrative, if any, is fresh too. Shared inputs are reusable when every node
+    consuming them is. `filing_unchanged` keeps filing-based metrics and narratives fresh.
+    """
+    if not stored:
+        return set()
+
+    reused = set()
+    for name, node in graph.items():
+        if "metrics" not in node and "narrative" not in node:
+            continue
+        stored_metrics = {m: stored["records"][m] for m in node.get("metrics", []) if m in stored["records"]}
+        if node.get("metrics") and not stored_metrics:
+            continue
+        if not all(is_fresh(m, record, today, filing_unchanged) for m, record in stored_metrics.items()):
+            continue
+        narrative = node.get("narrative")
+        if narrative and not (_narrative_stored(stored, narrative) and
+                              narrative_is_fresh(narrative, stored["date"], today, filing_unchanged)):
+            continue
+        reused.add(name)
+    for name in graph:
+        consumers = [n for n, node in graph.items() if name in node.get("inputs", [])]
+        if consumers and all(n in reused for n in consumers):
+            reused.add(name)
+    return reused
+
+
+def assess_verdict(records, pending_metrics):
+    """
+    Checks what the still-pending metrics can do to the verdict.
+    Returns (rejections, settled): the known metrics that already reject the ticker, and whether
+    no outcome of the pending metrics can change the verdict any more.
+    """
+    pending = set(pending_metrics)
+    pending |= {name for name in SCORING_SPEC if override_inputs(name) & pending}
+    known = {name: record for name, record in records.items() if name not in pending}
+    points, rejected = score_frame(frame_from_records({"_": known}), as_of=snapshots.today())
+    decided = [name for name in points.columns if name not in pending]
+
+    rejections = [name for name in decided if name in known and rejected.at["_", name]]
+    if rejections:
+        return rejections, True
+    ranges = [points_range(name) for name in pending if name in SCORING_SPEC]
+    if any(can_reject for _, _, can_reject in ranges):
+        return [], False
+    base = points.loc["_", decided].sum()
+    low, high = base + sum(r[0] for r in ranges), base + sum(r[1] for r in ranges)
+    return [], verdict_for([low], [False])[0] == verdict_for([high], [False])[0]
+
+
+async def _run_node(name, node, ticker, inputs, limits):
+    if limits and name in limits:
+        async with limits[name]:
+            return await asyncio.to_thread(node["run"], ticker, **inputs)
+    return await asyncio.to_thread(node["run"], ticker, **inputs)
+
+
+async def run_fetch_graph(ticker, graph=FETCH_GRAPH, full_report=False, limits=None, stored=None, reused=()):
+    """
+    Executes the fetch graph: each node starts as soon as its inputs and `after` nodes are done,
+    shared inputs (the Polygon company name) are fetched once and independent nodes run concurrently.
+    Unless `full_report` is set, optional nodes that have not started are pruned once their
+    metrics can no longer change the verdict, and shared inputs once none of their consumers will run.
+    Pruned metrics are scored as missing (with a "Skipped" note), so a pruned report's score can
+    differ from its full report's, though never its verdict.
+    `limits` optionally maps node names to asyncio semaphores shared across concurrent runs.
+    On a refresh, `stored` is the stored report and the `reused` nodes are not run.
+    Returns (results by node name, pruned node names, rejecting metric names).
+    """
+    results = {name: REUSED for name in reused}
+    results["stored"] = stored
+    running, pruned, rejections = {}, [], []
+    waiting = {name: node for name, node in graph.items() if name not in reused}
+
+    while waiting or running:
+        if "yahoo" in results:
+            records = collect_records(results)
+            if records is None:
+                # Without the fundamentals no report can be built
+                pruned += [name for name, node in waiting.items() if node.get("optional")]
+                waiting = {name: node for name, node in waiting.items() if not node.get("optional")}
+            else:
+                unfinished = [name for name in graph if name not in results]
+                rejections, settled = assess_verdict(
+                    records, [m for name in unfinished for m in graph[name].get("metrics", [])])
+                if settled and not full_report:
+                    for name, node in list(waiting.items()):
+                        if node.get("optional") and (rejections or not node.get("narrative")):
+                            pruned.append(name)
+                            del waiting[name]
+
+        for name in list(waiting):
+            consumers = [n for n, node in graph.items() if name in node.get("inputs", [])]
+            if consumers and all(n in pruned or results.get(n) is REUSED for n in consumers):
+                pruned.append(name)
+                del waiting[name]
+
+        for name, node in list(waiting.items()):
+            if all(dep in results for dep in node.get("inputs", []) + node.get("after", [])):
+                inputs = {dep: results[dep] if _usable(results[dep]) else None for dep in node.get("inputs", [])}
+                running[name] = asyncio.ensure_future(_run_node(name, node, ticker, inputs, limits))
+                del waiting[name]
+
+        if not running:
+            # Remaining nodes depend on pruned ones
+            pruned += list(waiting)
+            break
+        done, _ = await asyncio.wait(running.values(), return_when=asyncio.FIRST_COMPLETED)
+        for name, task in list(running.items()):
+            if task in done:
+                results[name] = task.exception() or task.result()
+                del running[name]
+
+    if pruned:
+        logging.info(f"{ticker}: skipped {pruned} (rejected by {rejections or 'none'}).")
+    return results, pruned, rejections
+
+
+async def run_parallel_analysis(ticker, full_report=False, limits=None, stored=None):
+    """
+    Runs all fetchers through the fetch graph.
+    The cheap Yahoo Finance / Alpha Vantage and Finviz nodes act as hard-reject gates; the Chromium
+    scrapes, Gemini prompts and EPS growth are skipped when the verdict is already settled,
+    unless `full_report` is set.
+    With a `stored` report (see storage.load_stored_report) only the stale nodes are fetched; when the
+    latest statement period still matches the stored one, filing-derived metrics and narratives are
+    reused and Yahoo Finance is only asked for the quote.
+    Concurrent calls for the same ticker within this process share one run; its result is reused
+    for SINGLE_FLIGHT_WINDOW seconds. The returned dict is shared and must not be modified.
+    Inside snapshots.replaying(...) the replayed sources read archived payloads instead of the
+    network (see replay.py); replays only share runs with the same sources and date.
+    """
+    key = (ticker.strip().upper(), full_report, stored["date"] if stored else None, snapshots.replay_state())
+    now = time.time()
+    with _flights_lock:
+        for k in [k for k, f in _flights.items() if f["done_at"] and now - f["done_at"] > SINGLE_FLIGHT_WINDOW]:
+            del _flights[k]
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = {"future": concurrent.futures.Future(), "done_at": None}
+
+    if not leader:
+        logging.info(f"Attaching to the in-flight analysis of {ticker}")
+        return await asyncio.wrap_future(flight["future"])
+
+    try:
+        graph, filing_unchanged = FETCH_GRAPH, False
+        if stored and stored.get("filing_period"):
+            try:
+                period = await asyncio.to_thread(latest_statement_period, ticker)
+            except Exception as e:
+                logging.warning(f"Filing period check failed for {ticker}: {e}")
+                period = None
+            filing_unchanged = period == stored["filing_period"]
+            if filing_unchanged:
+                graph = {**FETCH_GRAPH, "yahoo": MARKET_SNAPSHOT_NODE}
+        reused = reusable_nodes(stored, graph, today=snapshots.today(), filing_unchanged=filing_unchanged)
+        results, pruned, rejections = await run_fetch_graph(ticker, graph=graph, full_report=full_report,
+                                                             limits=limits, stored=stored, reused=reused)
+        results["filing_unchanged"] = filing_unchanged
+        results["skipped"] = pruned
+        results["reused"] = sorted(reused)
+        results["gate_rejections"] = rejections
+    except BaseException as e:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight["future"].set_exception(e)
+        raise
+    with _flights_lock:
+        if collect_records(results) is None:
+            _flights.pop(key, None)  # failed runs are not reused
+        else:
+            flight["done_at"] = time.time()
+    flight["future"].set_result(results)
+    return results
+
+
+def content_hash(ticker, report):
+    """SHA-256 of everything a saved analysis stores, so identical analyses hash the same."""
+    content = {key: report[key] for key in ("report_rows", "llm_analysis", "risk_reward", "filing_period")}
+    return hashlib.sha256(to_json({"ticker": ticker, **content}, sort_keys=True).encode()).hexdigest()
+
+
+def build_report(ticker, results):
+    """
+    Scores the collected records and assembles the report.
+    Returns None when the Yahoo Finance stage failed, otherwise a dict with
+    report_rows (numeric), score_summary, llm_analysis, risk_reward, filing_period,
+    plus the analysis_id and content_hash a save is keyed by.
+    """
+    records = collect_records(results)
+    if records is None:
+        return None
+
+    # Score all metrics at once from the declarative scoring spec
+    points, rejected = score_frame(frame_from_records({ticker: records}), as_of=snapshots.today())
+    score_summary = summarize_scores(points, rejected).loc[ticker].to_dict()
+    report_rows = []
+    for metric_name, record in records.items():
+        total_pts = TOTAL_POINTS.get(metric_name, 0.0)
+        report_rows.append({
+            "Metric Name": metric_name, "Source": record.source, "Value": record,
+            "Obtained points": float(points.at[ticker, metric_name]) if total_pts > 0 else None,
+            "Total points": total_pts,
+            "Rejected": bool(rejected.at[ticker, metric_name]) if metric_name in rejected else False})
+    report_rows.append(
+        {"Metric Name": "TOTAL", "Source": "", "Value": None,
+         "Obtained points": float(points.loc[ticker].sum()),
+         "Total points": sum(r["Total points"] for r in report_rows), "Rejected": False})
+
+    # Narratives fall back to the stored report when their node was reused, skipped or failed
+    stored = results.get("stored") or {}
+    if _usable(results.get("llm")):
+        llm_analysis = parse_llm_response(results["llm"])
+    else:
+        llm_analysis = dict(stored.get("llm_analysis") or parse_llm_response(""))
+    llm_analysis["ceo_ownership"] = records["CEO Ownership %"]
+    llm_analysis["classification"] = records["Business Model & Value Proposition"]
+    if _usable(results.get("risk_rewards")):
+        risk_reward = results["risk_rewards"]
+    else:
+        risk_reward = stored.get("risk_reward") or {"rewards": [], "risks": []}
+    yahoo = results.get("yahoo")
+    if _usable(yahoo) and yahoo.get("status") == "success" and not yahoo["data"].get("market_only"):
+        filing_period = yahoo["data"].get("Filing period")
+    else:
+        filing_period = stored.get("filing_period")
+    report = {"report_rows": report_rows, "score_summary": score_summary,
+              "llm_analysis": llm_analysis, "risk_reward": risk_reward, "filing_period": filing_period}
+    report["analysis_id"] = uuid.uuid4().hex
+    report["content_hash"] = content_hash(ticker, report)
+    return report
+
+
+def format_report_rows(report_rows):
+    """Render-time formatting of numeric report rows into display strings."""
+    display_rows = []
+    for r in report_rows:
+        obtained, total = r["Obtained points"], r["Total points"]
+        display_rows.append({
+            "Metric Name": r["Metric Name"],
+            "Source": r["Source"],
+            "Value": "" if r["Metric Name"] == "TOTAL" else format_metric(r["Value"]),
+            "As of": "" if r["Value"] is None else (r["Value"].as_of or ""),
+            "Obtained points": "rejected" if r["Rejected"] else ("" if obtained is None else f"{obtained:g}"),
+            "Total points": f"{total:g}" if total else "",
+        })
+    return display_rows
@@ -0,0 +1,111 @@
+import sys
+import asyncio
+import argparse
+import datetime
+import logging
+
+import pandas as pd
+from google.cloud import bigquery
+
+import mirror
+import snapshots
+from pipeline import run_parallel_analysis, build_report
+from bq_client import read_arrow, arrow_frame
+from metrics import NON_NUMERIC_UNITS
+from scoring import score_frame, summarize_scores
+from storage import table_path, HISTORY_TABLE_NAME
+
+# --- WINDOWS ASYNCIO FIX ---
+if sys.platform == 'win32':
+    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+
+# Replays do no network I/O, so many more run at once than in a live batch
+MAX_REPLAYS_IN_FLIGHT = 64
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def load_analyses(client, tickers=None, since=None):
+    """
+    One row per saved analysis (oldest first), indexed by analysis_id: ticker, saved_at, content_hash,
+    and its stored metrics scored with the current SCORING_SPEC as of its date (Final Score, Verdict).
+    """
+    clauses, params = [], []
+    if tickers:
+        clauses.append("ticker IN UNNEST(@tickers)")
+        params.append(bigquery.ArrayQueryParameter("tickers", "STRING", list(tickers)))
+    if since:
+        clauses.append("analysis_date >= @since")
+        params.append(bigquery.ScalarQueryParameter("since", "DATE", since))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = arrow_frame(read_arrow(client, f"""
+        SELECT analysis_id, ticker, analysis_date, saved_at, metric, unit, value, value_text, content_hash
+        FROM `{table_path(client, HISTORY_TABLE_NAME)}` {where}
+    """, params))
+    if rows.empty:
+        return pd.DataFrame(columns=["ticker", "saved_at", "content_hash", "Final Score", "Verdict"]) \
+            .rename_axis("analysis_id")
+    analyses = rows.groupby("analysis_id").agg(ticker=("ticker", "first"), analysis_date=("analysis_date", "first"),
+                                               saved_at=("saved_at", "min"), content_hash=("content_hash", "first"))
+    analyses = analyses.sort_values("saved_at")
+
+    metrics = rows[rows["unit"] != "text"]
+    text_units = metrics["unit"].isin(NON_NUMERIC_UNITS)
+    numeric = metrics[~text_units].pivot(index="analysis_id", columns="metric", values="value").astype("float64")
+    text = metrics[text_units].pivot(index="analysis_id", columns="metric", values="value_text").astype(object)
+    values = pd.concat([numeric, text.where(text.notna(), None)], axis=1).reindex(analyses.index)
+    points, rejected = score_frame(values, as_of=analyses["analysis_date"])
+    return analyses.join(summarize_scores(points, rejected)[["Final Score", "Verdict"]])
+
+
+async def replay_analyses(analyses, sources=snapshots.REPLAY_SOURCES, full_report=False):
+    """
+    Re-runs saved analyses from the snapshot archive, each with the payloads fetched up to its save time,
+    and compares them with what was saved. Returns one row per analysis; "Reproduced" is True when
+    the replayed report hashes the same as the saved one.
+    """
+    in_flight = asyncio.Semaphore(MAX_REPLAYS_IN_FLIGHT)
+
+    async def replay(analysis):
+        ticker = analysis["ticker"]
+        row = {"Ticker": ticker, "Analysis": analysis["analysis_id"], "Saved at": analysis["saved_at"],
+               "Stored Score": float(analysis["Final Score"]), "Stored Verdict": analysis["Verdict"]}
+        async with in_flight:
+            try:
+                with snapshots.replaying(sources, as_of=analysis["saved_at"]):
+                    results = await run_parallel_analysis(ticker, full_report=full_report)
+                    report = build_report(ticker, results)
+            except Exception as e:
+                logging.error(f"Replay of {ticker} ({analysis['analysis_id']}) failed: {e}")
+                report = None
+        if report is None:
+            return {**row, "Verdict": "Analysis failed", "Reproduced": False}
+        summary = report["score_summary"]
+        return {**row, "Score": float(summary["Final Score"]), "Verdict": summary["Verdict"],
+                "Reproduced": report["content_hash"] == analysis["content_hash"]}
+
+    rows = await asyncio.gather(*(replay(analysis) for analysis in analyses.reset_index().to_dict("records")))
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run saved analyses offline from the raw snapshot archive.")
+    parser.add_argument("tickers", nargs="*", help="Only these tickers (default: every analysis in the mirror).")
+    parser.add_argument("--since", type=datetime.date.fromisoformat, help="Only analyses from this date on.")
+    parser.add_argument("--sources", type=snapshots.parse_sources, default=snapshots.REPLAY_SOURCES,
+                        help="Sources read from the archive: 'all' (default) or comma-separated, "
+                             f"from {', '.join(snapshots.REPLAY_SOURCES)}; the others are fetched live.")
+    parser.add_argument("--full-report", action="store_true", help="Run every fetcher even for rejected tickers.")
+    parser.add_argument("--sync", action="store_true", help="Sync the local mirror from BigQuery first.")
+    parser.add_argument("--out", help="Export the comparison table to this CSV file (default: stdout).")
+    args = parser.parse_args()
+
+    if args.sync:
+        mirror.sync()
+    analyses = load_analyses(mirror.get_mirror(), [t.upper() for t in args.tickers], args.since)
+    logging.info(f"Replaying {len(analyses)} analyses")
+    table = asyncio.run(replay_analyses(analyses, args.sources, args.full_report))
+    if not table.empty:
+        logging.info(f"Reproduced {int(table['Reproduced'].sum())} of {len(table)} analyses exactly; "
+                     f"{int((table['Verdict'] != table['Stored Verdict']).sum())} verdicts differ.")
+    table.to_csv(args.out or sys.stdout, index=False)
@@ -0,0 +1,60 @@
+import sys
+import argparse
+import logging
+
+import pandas as pd
+
+import mirror
+from scoring import score_frame, summarize_scores
+from bq_client import get_client
+from storage import SECTION_COLUMNS, load_stored_analyses, write_scores
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def rescore_all(dry_run=False):
+    """
+    Re-applies the current SCORING_SPEC to every stored analysis and writes the
+    new scores and verdicts back in bulk. Date-relative rules (option expiry)
+    are evaluated against each analysis date, not today.
+    Returns the summary frame (one row per ticker, with the previous score and verdict).
+    """
+    client = get_client()
+    if client is None:
+        raise RuntimeError("BigQuery client could not be created")
+
+    master, values = load_stored_analyses(client)
+    if values.empty:
+        logging.info("No stored analyses found.")
+        return pd.DataFrame()
+
+    master = master.loc[values.index]
+    points, rejected = score_frame(values, as_of=master["date"])
+    summary = summarize_scores(points, rejected)
+    summary["Previous Score"] = master["Score"]
+    summary["Previous Verdict"] = master["Verdict"]
+
+    # Rows saved before the summary columns existed have no final_score; write those back too
+    stale = master["final_score"].isna()
+    for section, column in SECTION_COLUMNS.items():
+        stale |= summary[section].round(6) != master[column].round(6)
+    changed = summary[(summary["Final Score"].astype(int) != summary["Previous Score"]) |
+                      (summary["Verdict"] != summary["Previous Verdict"]) | stale]
+    logging.info(f"Re-scored {len(summary)} tickers; {len(changed)} changed score, verdict or section subtotals.")
+
+    if not dry_run and not changed.empty:
+        write_scores(client, master, summary.loc[changed.index], points.loc[changed.index],
+                     rejected.loc[changed.index])
+        logging.info("Scores written back to BigQuery.")
+        mirror.sync(full=True)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score all stored analyses with the current scoring spec.")
+    parser.add_argument("--dry-run", action="store_true", help="Compute and report changes without writing.")
+    args = parser.parse_args()
+
+    result = rescore_all(dry_run=args.dry_run)
+    if not result.empty:
+        result.to_csv(sys.stdout)
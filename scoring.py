@@ -0,0 +1,253 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from metrics import MetricRecord
+
+REJECT = -1.0
+
+# --- Declarative scoring spec ---
+# bins: ascending (bound, "lt" | "le", points) upper bounds; values above the last bound get `above`.
+# keywords: (regex, points) checked in order against category text; unmatched text gets `default`.
+# overrides: checked before the bins, first match wins; `missing: True` also matches a missing input.
+# missing: points when the value itself is missing.
+SCORING_SPEC = {
+    "Runway": {
+        "total": 10, "missing": 3, "above": 10,
+        "bins": [(6, "lt", REJECT), (12, "lt", 3), (24, "lt", 7)],
+    },
+    "Net Debt / EBITDA": {
+        "total": 7, "missing": 7, "above": REJECT,
+        "overrides": [
+            {"metric": "Net Debt", "op": "lt", "bound": 0, "points": 7},
+            {"metric": "EBITDA", "op": "le", "bound": 0, "points": REJECT, "missing": True},
+        ],
+        "bins": [(0, "le", 7), (1.5, "le", 5), (3, "le", 3)],
+    },
+    "Assets / Liabilities Ratio": {
+        "total": 5, "missing": 1, "above": 5,
+        "bins": [(1.0, "lt", REJECT), (1.5, "lt", 1), (2.0, "lt", 3)],
+    },
+    "Cash Burn Severity": {
+        "total": 3, "missing": 1, "above": REJECT,
+        "bins": [(0, "le", 3), (10, "lt", 2), (20, "le", 1)],
+    },
+    "Share Count Growth": {
+        "total": 3, "missing": 1, "above": REJECT,
+        "bins": [(0, "le", 3), (5, "lt", 2), (10, "le", 1)],
+    },
+    "latest expiration date": {
+        "total": 0, "missing": REJECT, "above": 0, "transform": "months_until",
+        "bins": [(18, "lt", REJECT)],
+    },
+    "Capital Structure Pressure": {
+        "total": 2, "missing": 1, "default": 0,
+        "keywords": [("no convert", 2), ("minor", 1), ("heavy|atm", REJECT)],
+    },
+    "Market cap": {
+        "total": 5, "missing": 5, "above": REJECT, "scale": 1e-9,
+        "bins": [(2, "lt", 5), (5, "le", 3)],
+    },
+    "Forward EPS Growth (%)": {
+        "total": 7, "missing": 1, "above": 7,
+        "bins": [(10, "lt", 0), (20, "lt", 3), (30, "lt", 5)],
+    },
+    "Degree of Operating Leverage": {
+        "total": 5, "missing": 0, "above": 5,
+        "bins": [(1.5, "lt", 0), (2.0, "lt", 2), (3.0, "lt", 4)],
+    },
+    "IV Rank": {
+        "total": 3, "missing": 1, "above": 0,
+        "bins": [(30, "lt", 3), (60, "le", 2)],
+    },
+    "Short Float (%)": {
+        "total": 4, "missing": 1, "above": 0,
+        "bins": [(5, "lt", 1), (10, "lt", 2), (30, "le", 4)],
+    },
+    "Institutional Ownership (%)": {
+        "total": 3, "missing": 1, "above": 1,
+        "bins": [(40, "lt", 3), (60, "le", 2)],
+    },
+    "Total insider ownership %": {
+        "total": 6, "missing": 2, "above": 3,
+        "bins": [(1, "lt", 0), (2, "lt", 2), (5, "lt", 4), (30, "le", 6)],
+    },
+    "CEO Ownership %": {
+        "total": 3, "missing": 1, "above": 3,
+        "bins": [(1, "lt", 0), (2, "lt", 1), (5, "lt", 2)],
+    },
+    "Net Insider Buying vs Selling (%)": {
+        "total": 4, "missing": 1, "above": 4,
+        "bins": [(0, "lt", 0), (0, "le", 1), (1, "le", 2)],
+    },
+    "GuruFocus Moat Score": {
+        "total": 15, "missing": 0, "above": 15,
+        "bins": [(2, "lt", 0), (3, "lt", 5), (4, "lt", 9)],
+    },
+    "Business Model & Value Proposition": {
+        "total": 15, "missing": 0, "default": 0,
+        "keywords": [("mission-critical|infrastructure", 15), ("saas|platform|high switching", 10),
+                     ("commodity", 5)],
+    },
+}
+
+# Summary sections (metric names per section, in display order)
+SECTIONS = {
+    "Financial Survival & Balance Sheet": ["Runway", "Net Debt / EBITDA", "Assets / Liabilities Ratio",
+                                           "Cash Burn Severity", "Share Count Growth",
+                                           "Capital Structure Pressure"],
+    "Growth & Asymmetric Upside": ["Market cap", "Forward EPS Growth (%)", "Degree of Operating Leverage",
+                                   "IV Rank", "Short Float (%)", "Institutional Ownership (%)"],
+    "Insider Alignment & Behavior": ["Total insider ownership %", "CEO Ownership %",
+                                     "Net Insider Buying vs Selling (%)"],
+    "Moat & Qualitative Conviction": ["GuruFocus Moat Score", "Business Model & Value Proposition"],
+}
+
+# (minimum final score, verdict), checked in order; rejected rows are always "❌ Rejected"
+VERDICTS = [(80, "🔥 Elite LEAPS Candidate"), (70, "✅ Qualified"), (60, "⚠️ Watchlist")]
+REJECTED_VERDICT = "❌ Rejected"
+
+_COMPARATORS = {
+    "lt": np.less,
+    "le": np.less_equal,
+}
+
+
+def _compile_rule(rule):
+    compiled = dict(rule)
+    if "bins" in rule:
+        edges, points = [], []
+        for bound, op, pts in rule["bins"]:
+            # "le" bounds become half-open by moving the edge to the next representable float
+            edges.append(np.nextafter(bound, np.inf) if op == "le" else float(bound))
+            points.append(pts)
+        compiled["edges"] = np.array(edges, dtype="float64")
+        compiled["points"] = np.array(points + [rule["above"]], dtype="float64")
+    return compiled
+
+
+COMPILED_SPEC = {name: _compile_rule(rule) for name, rule in SCORING_SPEC.items()}
+TOTAL_POINTS = {name: float(rule["total"]) for name, rule in SCORING_SPEC.items()}
+
+
+def points_range(name):
+    """
+    (lowest, highest, can_reject) over every possible outcome of one metric's rule.
+    Rejections count as 0 points.
+    """
+    rule = COMPILED_SPEC[name]
+    outcomes = [rule["missing"]] + [o["points"] for o in rule.get("overrides", [])]
+    if "keywords" in rule:
+        outcomes += [pts for _, pts in rule["keywords"]] + [rule["default"]]
+    else:
+        outcomes += list(rule["points"])
+    scored = [0.0 if pts == REJECT else float(pts) for pts in outcomes]
+    return min(scored), max(scored), REJECT in outcomes
+
+
+def override_inputs(name):
+    """Other metrics whose values can change this metric's score through its overrides."""
+    return {o["metric"] for o in SCORING_SPEC.get(name, {}).get("overrides", [])}
+
+
+def months_until(values, today=None):
+    """
+    Whole calendar months from `today` to each date (NaN where the date is missing or unparsable).
+    `today` may be a single date or one reference date per value.
+    """
+    dates = pd.to_datetime(pd.Series(values).reset_index(drop=True), errors="coerce")
+    if today is None or np.isscalar(today) or isinstance(today, datetime.date):
+        ref = pd.Series(pd.Timestamp(today or datetime.date.today()), index=dates.index)
+    else:
+        ref = pd.to_datetime(pd.Series(today).reset_index(drop=True), errors="coerce")
+    return ((dates.dt.year - ref.dt.year) * 12 + (dates.dt.month - ref.dt.month)).to_numpy(dtype="float64")
+
+
+def _numeric_column(values, name):
+    return pd.to_numeric(values[name], errors="coerce").to_numpy(dtype="float64") \
+        if name in values.columns else np.full(len(values), np.nan)
+
+
+def _score_metric(values, rule, as_of=None):
+    name_values = values[rule["name"]] if rule["name"] in values.columns else pd.Series(np.nan, index=values.index)
+
+    if "keywords" in rule:
+        text = name_values.astype("string").str.lower()
+        missing = text.isna().to_numpy()
+        text = text.fillna("")
+        conditions = [text.str.contains(pattern, regex=True).to_numpy() for pattern, _ in rule["keywords"]]
+        scored = np.select(conditions, [pts for _, pts in rule["keywords"]], default=rule["default"])
+        return np.where(missing, rule["missing"], scored).astype("float64")
+
+    if rule.get("transform") == "months_until":
+        x = months_until(name_values, as_of)
+    else:
+        x = pd.to_numeric(name_values, errors="coerce").to_numpy(dtype="float64") * rule.get("scale", 1.0)
+
+    missing = np.isnan(x)
+    scored = rule["points"][np.searchsorted(rule["edges"], np.where(missing, 0.0, x), side="right")]
+    scored = np.where(missing, rule["missing"], scored)
+
+    # Overrides are applied last-to-first so the first matching override wins
+    for override in reversed(rule.get("overrides", [])):
+        other = _numeric_column(values, override["metric"])
+        hit = _COMPARATORS[override["op"]](np.nan_to_num(other, nan=np.inf), override["bound"])
+        if override.get("missing"):
+            hit |= np.isnan(other)
+        scored = np.where(hit, override["points"], scored)
+    return scored.astype("float64")
+
+
+def score_frame(values, as_of=None):
+    """
+    Scores a whole frame of metric values at once.
+    `values` is indexed by ticker with one column per metric name (floats for numeric
+    metrics, strings for dates and categories; NaN/None for missing).
+    `as_of` optionally gives the analysis date per row for date-relative rules (defaults to today).
+    Returns (points, rejected): points per scored metric (0 where rejected) and a boolean rejection mask.
+    """
+    raw = {}
+    for name, rule in COMPILED_SPEC.items():
+        raw[name] = _score_metric(values, {**rule, "name": name}, as_of)
+    raw = pd.DataFrame(raw, index=values.index)
+    rejected = raw == REJECT
+    points = raw.mask(rejected, 0.0)
+    return points, rejected
+
+
+def verdict_for(final_score, is_rejected):
+    """Vectorized verdict labels for arrays of final scores and rejection flags."""
+    final_score = np.asarray(final_score, dtype="float64")
+    conditions = [np.asarray(is_rejected, dtype=bool)] + [final_score >= threshold for threshold, _ in VERDICTS]
+    choices = [REJECTED_VERDICT] + [label for _, label in VERDICTS]
+    return np.select(conditions, choices, default=REJECTED_VERDICT)
+
+
+def summarize_scores(points, rejected):
+    """Section subtotals, final score, rejection flag and verdict per ticker."""
+    summary = pd.DataFrame(index=points.index)
+    for section, names in SECTIONS.items():
+        summary[section] = points[names].sum(axis=1)
+    summary["Final Score"] = summary[list(SECTIONS)].sum(axis=1)
+    summary["Rejected"] = rejected.any(axis=1)
+    summary["Verdict"] = verdict_for(summary["Final Score"], summary["Rejected"])
+    return summary
+
+
+def frame_from_records(records_by_ticker):
+    """Builds the score_frame input from {ticker: {metric name: MetricRecord}}."""
+    return pd.DataFrame.from_dict(
+        {ticker: {name: (r.value if isinstance(r, MetricRecord) else r) for name, r in records.items()}
+         for ticker, records in records_by_ticker.items()},
+        orient="index")
+
+
+def score_records(records):
+    """
+    Scores a single analysis given {metric name: MetricRecord}.
+    Returns {metric name: (obtained points, total points, is_rejected)} for the scored metrics.
+    """
+    points, rejected = score_frame(frame_from_records({"_": records}))
+    return {name: (float(points.at["_", name]), TOTAL_POINTS[name], bool(rejected.at["_", name]))
+            for name in points.columns}
@@ -0,0 +1,148 @@
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import snapshots
+
+# --- Local share-count store (one compressed .npz file per ticker) ---
+CACHE_DIR = os.path.join(os.environ.get("LEAPS_CACHE_DIR", ".cache"), "share_counts")
+INITIAL_HISTORY_YEARS = 5
+REFRESH_INTERVAL = timedelta(hours=12)
+
+_EMPTY_DATES = np.array([], dtype="datetime64[ns]")
+_EMPTY_SHARES = np.array([], dtype="float64")
+
+
+def _store_path(ticker_symbol):
+    return os.path.join(CACHE_DIR, f"{ticker_symbol.strip().upper()}.npz")
+
+
+def load_share_history(ticker_symbol):
+    """
+    Reads the stored share-count history for a ticker.
+    Returns (dates, shares, fetched_at) with dates sorted ascending, or empty arrays if nothing is stored.
+    """
+    path = _store_path(ticker_symbol)
+    if not os.path.exists(path):
+        return _EMPTY_DATES, _EMPTY_SHARES, None
+    try:
+        with np.load(path) as store:
+            dates = store["dates"].astype("datetime64[ns]")
+            shares = store["shares"].astype("float64")
+            fetched_at = pd.Timestamp(store["fetched_at"][0]).to_pydatetime()
+        return dates, shares, fetched_at
+    except Exception as e:
+        logging.warning(f"Share-count store for {ticker_symbol} is unreadable, rebuilding: {e}")
+        return _EMPTY_DATES, _EMPTY_SHARES, None
+
+
+def save_share_history(ticker_symbol, dates, shares, fetched_at):
+    """Atomically writes the share-count history for a ticker."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _store_path(ticker_symbol)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # one per writer
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            dates=dates.astype("datetime64[ns]"),
+            shares=shares.astype("float64"),
+            fetched_at=np.array([np.datetime64(fetched_at, "ns")]),
+        )
+    os.replace(tmp_path, path)
+
+
+def merge_share_points(dates, shares, new_dates, new_shares):
+    """
+    Merges new points into the stored arrays.
+    On duplicate dates the newest fetch wins; the result is sorted ascending.
+    """
+    all_dates = np.concatenate([dates, new_dates])
+    all_shares = np.concatenate([shares, new_shares])
+    order = np.argsort(all_dates, kind="stable")
+    all_dates, all_shares = all_dates[order], all_shares[order]
+    keep_last = np.append(all_dates[1:] != all_dates[:-1], True)
+    return all_dates[keep_last], all_shares[keep_last]
+
+
+def get_share_history(ticker, ticker_symbol):
+    """
+    Returns the share-count history (dates, shares) for a yfinance Ticker (see refresh_share_history).
+    The whole series is archived as one payload, so a replay gets exactly the points the CAGR was computed from.
+    """
+    def fetch():
+        dates, shares = refresh_share_history(ticker, ticker_symbol)
+        return pd.Series(shares, index=pd.DatetimeIndex(dates))
+
+    series = snapshots.capture(ticker_symbol, "yahoo", "shares_history", fetch)
+    if series is None:
+        # Replay of an analysis archived before the full series was: fall back to the store and the download
+        return refresh_share_history(ticker, ticker_symbol)
+    return series.index.to_numpy(dtype="datetime64[ns]"), series.to_numpy(dtype="float64")
+
+
+def refresh_share_history(ticker, ticker_symbol):
+    """
+    Returns the stored share-count history (dates, shares), downloading only the points newer
+    than the last stored date once the store is older than REFRESH_INTERVAL.
+    A replay sees the stored points up to the replay date plus the archived download, and leaves the store as is.
+    """
+    dates, shares, fetched_at = load_share_history(ticker_symbol)
+    replayed = snapshots.is_replayed("yahoo")
+    now = datetime.now()
+    if replayed:
+        known = dates < np.datetime64(snapshots.today() + timedelta(days=1), "ns")
+        dates, shares = dates[known], shares[known]
+    elif fetched_at is not None and now - fetched_at < REFRESH_INTERVAL:
+        return dates, shares
+
+    if len(dates):
+        start = pd.Timestamp(dates[-1]).to_pydatetime()
+    else:
+        start = now - pd.DateOffset(years=INITIAL_HISTORY_YEARS)
+
+    try:
+        new_data = snapshots.capture(ticker_symbol, "yahoo", "shares_full", lambda: ticker.get_shares_full(start=start))
+    except Exception as e:
+        logging.warning(f"Share-count refresh failed for {ticker_symbol}, using stored history: {e}")
+        return dates, shares
+
+    if new_data is not None and not new_data.empty:
+        new_index = pd.DatetimeIndex(new_data.index)
+        if new_index.tz is not None:
+            new_index = new_index.tz_localize(None)
+        new_values = pd.to_numeric(new_data, errors="coerce").to_numpy(dtype="float64")
+        valid = ~np.isnan(new_values)
+        dates, shares = merge_share_points(
+            dates, shares, new_index.to_numpy(dtype="datetime64[ns]")[valid], new_values[valid]
+        )
+
+    if not replayed:
+        save_share_history(ticker_symbol, dates, shares, now)
+    return dates, shares
+
+
+def share_count_cagr(dates, shares, years=3):
+    """
+    Computes the share-count CAGR between the latest point and the point
+    nearest to `years` before it. Returns None when there is not enough history.
+    """
+    if len(dates) < 2:
+        return None
+
+    target = (pd.Timestamp(dates[-1]) - pd.DateOffset(years=years)).to_datetime64()
+    pos = np.searchsorted(dates, target)
+    candidates = np.clip([pos - 1, pos], 0, len(dates) - 1)
+    distances = np.abs(dates[candidates] - target)
+    idx_3y = candidates[np.argmin(distances)]
+    if idx_3y >= len(dates) - 1:
+        return None
+
+    latest_s, hist_s = shares[-1], shares[idx_3y]
+    years_diff = (dates[-1] - dates[idx_3y]) / np.timedelta64(1, "D") / 365.25
+    if not (np.isfinite(latest_s) and np.isfinite(hist_s)) or hist_s <= 0 or latest_s <= 0 or years_diff <= 0:
+        return None
+    return float((latest_s / hist_s) ** (1 / years_diff) - 1)
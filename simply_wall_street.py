@@ -1,10 +1,11 @@
 import requests
 import json
-import time
 import re
 import logging
 import streamlit as st
 
+import snapshots
+
 POLYGON_API_KEY = st.secrets["POLYGON_API_KEY_2"]
 GEMINI_API_KEY = st.secrets["GEMINI_API_KEY"]
 
@@ -14,10 +15,14 @@ logger = logging.getLogger("Scraper")
 
 def get_company_name(ticker):
     url = f"https://api.polygon.io/v3/reference/tickers/{ticker.upper()}?apiKey={POLYGON_API_KEY}"
-    try:
+
+    def fetch_reference():
         response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
+        return response.json() if response.status_code == 200 else None
+
+    try:
+        data = snapshots.capture(ticker, "company_name", "polygon", fetch_reference)
+        if data is not None:
             name = data.get("results", {}).get("name")
             if name:
                 logger.info(f"Resolved ticker '{ticker}' to official name: '{name}'")
@@ -27,8 +32,8 @@ def get_company_name(ticker):
     return ticker
 
 
-def scrape_risk_rewards(ticker):
-    official_name = get_company_name(ticker)
+def scrape_risk_rewards(ticker, company_name=None):
+    official_name = company_name or get_company_name(ticker)
 
     # Updated Endpoint to match prompt requirements
     url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-09-2025:generateContent?key={GEMINI_API_KEY}"
@@ -59,17 +64,20 @@ def scrape_risk_rewards(ticker):
         }
     }
 
+    def ask_gemini():
+        response = requests.post(url, json=payload, timeout=60)
+
+        if response.status_code != 200:
+            logger.error(f"Gemini API Error {response.status_code}: {response.text}")
+            response.raise_for_status()
+
+        return response.json()
+
     max_retries = 3
     for attempt in range(max_retries):
         try:
             logger.info(f"Attempt {attempt + 1} for {ticker.upper()} (Gemini Search)...")
-            response = requests.post(url, json=payload, timeout=60)
-
-            if response.status_code != 200:
-                logger.error(f"Gemini API Error {response.status_code}: {response.text}")
-                response.raise_for_status()
-
-            result_json = response.json()
+            result_json = snapshots.capture(ticker, "risk_rewards", "gemini", ask_gemini) or {}
             candidates = result_json.get('candidates', [])
 
             if not candidates:
@@ -94,7 +102,7 @@ def scrape_risk_rewards(ticker):
                 if attempt < max_retries - 1:
                     logger.warning(
                         f"Both Risks and Rewards were empty for {ticker}. Retrying (Attempt {attempt + 2})...")
-                    time.sleep(2)
+                    snapshots.pause("risk_rewards", 2)
                     continue
                 else:
                     logger.warning(f"Final attempt for {ticker} still returned empty data.")
@@ -112,7 +120,7 @@ def scrape_risk_rewards(ticker):
         except (requests.exceptions.RequestException, json.JSONDecodeError, KeyError, ValueError) as e:
             if attempt < max_retries - 1:
                 logger.warning(f"Technical error on attempt {attempt + 1}: {e}. Retrying...")
-                time.sleep(2)
+                snapshots.pause("risk_rewards", 2)
             else:
                 logger.error(f"Final technical failure for {ticker}: {e}")
                 return {"company": official_name, "rewards": [], "risks": []}
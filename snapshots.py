@@ -0,0 +1,409 @@
+import os
+import json
+import time
+import sqlite3
+import datetime
+import contextlib
+import contextvars
+import hashlib
+import argparse
+import logging
+import threading
+
+import pandas as pd
+import zstandard
+
+# Raw payloads of every fetch (statements, API JSON, page fragments, LLM responses), so a score
+# can be audited or recomputed without refetching. Payloads are stored once per content hash,
+# zstd-compressed; the index maps (ticker, source, name, fetch time) to a hash.
+SNAPSHOT_DIR = os.path.join(os.environ.get("LEAPS_CACHE_DIR", ".cache"), "snapshots")
+INDEX_PATH = os.path.join(SNAPSHOT_DIR, "index.sqlite3")
+# gs://bucket/prefix: keep the payloads in Cloud Storage instead of SNAPSHOT_DIR (the index stays local)
+SNAPSHOT_BUCKET = os.environ.get("LEAPS_SNAPSHOT_BUCKET")
+ZSTD_LEVEL = 9
+# Fetch-graph nodes whose payloads can be replayed
+REPLAY_SOURCES = ["company_name", "yahoo", "finviz", "moat", "iv_rank", "eps_growth", "llm", "risk_rewards"]
+# Days a snapshot is kept, per source; the newest snapshot of each (ticker, source, name) is never pruned.
+# Quote pages change daily and are only kept for recent audits.
+DEFAULT_RETENTION_DAYS = 365
+RETENTION_DAYS = {"finviz": 90, "iv_rank": 90}
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker TEXT NOT NULL,
+    source TEXT NOT NULL,
+    name TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_lookup ON snapshots (ticker, source, name, fetched_at);
+CREATE INDEX IF NOT EXISTS snapshots_digest ON snapshots (digest);
+"""
+
+_store = None
+_store_lock = threading.Lock()
+_local = threading.local()
+# {"sources": frozenset, or None for all, "as_of": epoch seconds or None}; see replaying()
+_replay = contextvars.ContextVar("snapshot_replay", default=None)
+
+
+def connect(path=None):
+    """Opens the snapshot index (WAL mode: fetcher threads and worker processes write concurrently)."""
+    path = path or INDEX_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _reader():
+    """This thread's index connection for lookups (replays read thousands of payloads)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = connect()
+    return conn
+
+
+# --- Payload encoding ---
+# JSON text for everything; frames and series keep their labels (dates with their time zone).
+def _json_default(value):
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_labels(labels):
+    if isinstance(labels, pd.DatetimeIndex):
+        return {"dates": [ts.isoformat() for ts in labels], "tz": str(labels.tz) if labels.tz else None}
+    return {"values": list(labels)}
+
+
+def _decode_labels(labels):
+    if "dates" not in labels:
+        return labels["values"]
+    if labels["tz"]:
+        return pd.DatetimeIndex(pd.to_datetime(labels["dates"], utc=True)).tz_convert(labels["tz"])
+    return pd.DatetimeIndex(pd.to_datetime(labels["dates"]))
+
+
+def encode(payload):
+    """(kind, text) of a payload: a DataFrame, Series, str, or anything JSON-serializable."""
+    if isinstance(payload, pd.DataFrame):
+        data = {"index": _encode_labels(payload.index), "columns": _encode_labels(payload.columns),
+                "data": payload.to_numpy(dtype=object).tolist()}
+        return "frame", json.dumps(data, default=_json_default)
+    if isinstance(payload, pd.Series):
+        data = {"index": _encode_labels(payload.index), "name": payload.name,
+                "data": payload.to_numpy(dtype=object).tolist()}
+        return "series", json.dumps(data, default=_json_default)
+    if isinstance(payload, str):
+        return "text", payload
+    return "json", json.dumps(payload, sort_keys=True, default=_json_default)
+
+
+def decode(kind, text):
+    if kind == "text":
+        return text
+    data = json.loads(text)
+    if kind == "frame":
+        return pd.DataFrame(data["data"], index=_decode_labels(data["index"]), columns=_decode_labels(data["columns"]))
+    if kind == "series":
+        return pd.Series(data["data"], index=_decode_labels(data["index"]), name=data["name"], dtype=object) \
+            .infer_objects()
+    return data
+
+
+# --- Blob stores ---
+class LocalStore:
+    """Compressed payloads under root/objects/<2 hex>/<digest>.zst."""
+
+    def __init__(self, root):
+        self.root = os.path.join(root, "objects")
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], f"{digest[2:]}.zst")
+
+    def exists(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def put(self, digest, blob):
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+
+    def get(self, digest):
+        with open(self._path(digest), "rb") as f:
+            return f.read()
+
+    def delete(self, digest):
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    def digests(self):
+        for folder in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            for name in os.listdir(os.path.join(self.root, folder)):
+                if name.endswith(".zst"):
+                    yield folder + name[:-len(".zst")]
+
+
+class GCSStore:
+    """Compressed payloads as gs://bucket/prefix/<digest>.zst objects."""
+
+    def __init__(self, url):
+        from google.cloud import storage
+        from google.oauth2 import service_account
+        from bq_client import service_account_info
+
+        bucket, _, prefix = url[len("gs://"):].partition("/")
+        info = service_account_info()
+        credentials = service_account.Credentials.from_service_account_info(info) if info else None
+        client = storage.Client(credentials=credentials, project=info.get("project_id") if info else None)
+        self.bucket = client.bucket(bucket)
+        self.prefix = prefix.strip("/")
+
+    def _name(self, digest):
+        return f"{self.prefix}/{digest}.zst" if self.prefix else f"{digest}.zst"
+
+    def exists(self, digest):
+        return self.bucket.blob(self._name(digest)).exists()
+
+    def put(self, digest, blob):
+        self.bucket.blob(self._name(digest)).upload_from_string(blob, content_type="application/zstd")
+
+    def get(self, digest):
+        return self.bucket.blob(self._name(digest)).download_as_bytes()
+
+    def delete(self, digest):
+        self.bucket.blob(self._name(digest)).delete()
+
+    def digests(self):
+        for blob in self.bucket.list_blobs(prefix=f"{self.prefix}/" if self.prefix else None):
+            if blob.name.endswith(".zst"):
+                yield blob.name.rsplit("/", 1)[-1][:-len(".zst")]
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = GCSStore(SNAPSHOT_BUCKET) if SNAPSHOT_BUCKET else LocalStore(SNAPSHOT_DIR)
+    return _store
+
+
+# --- Archive ---
+def archive(ticker, source, name, payload, fetched_at=None):
+    """Stores one raw payload (deduplicated by content) and indexes it; returns its digest."""
+    kind, text = encode(payload)
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    store = get_store()
+    if not store.exists(digest):
+        blob = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+        store.put(digest, blob)
+        stored_size = len(blob)
+    else:
+        stored_size = 0  # already archived by an earlier fetch
+    conn = connect()
+    try:
+        conn.execute("INSERT INTO snapshots (ticker, source, name, fetched_at, kind, digest, size, stored_size) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     (ticker.upper(), source, name, fetched_at or time.time(), kind, digest, len(data), stored_size))
+    finally:
+        conn.close()
+    return digest
+
+
+def capture(ticker, source, name, fetch):
+    """
+    Runs one raw fetch and archives what it returned (None is not archived). Archiving never fails
+    the fetch. `source` is the fetch-graph node the payload belongs to; `name` tells its payloads apart.
+    While `source` is replayed (see replaying) the archived payload is returned instead and
+    `fetch` is not called; None when nothing was archived.
+
+        info = capture(symbol, "yahoo", "info", lambda: ticker.info)
+    """
+    if is_replayed(source):
+        state = _replay.get()
+        return latest(ticker, source, name, before=state["as_of"])
+    payload = fetch()
+    if payload is not None:
+        try:
+            archive(ticker, source, name, payload)
+        except Exception as e:
+            logger.warning(f"Could not archive {source}/{name} for {ticker}: {e}")
+    return payload
+
+
+def read(digest, kind):
+    """The payload stored under `digest`, decoded as `kind`."""
+    return decode(kind, zstandard.ZstdDecompressor().decompress(get_store().get(digest)).decode("utf-8"))
+
+
+def find(ticker=None, source=None, name=None, before=None):
+    """Index rows (newest first), filtered by ticker, source, name and fetch time (epoch seconds)."""
+    clauses, params = [], []
+    for column, value in (("ticker", ticker.upper() if ticker else None), ("source", source), ("name", name)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if before is not None:
+        clauses.append("fetched_at <= ?")
+        params.append(before)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    conn = connect()
+    try:
+        return pd.read_sql_query(f"SELECT * FROM snapshots {where} ORDER BY fetched_at DESC, id DESC", conn,
+                                 params=params)
+    finally:
+        conn.close()
+
+
+def latest(ticker, source, name, before=None):
+    """The newest archived payload of one fetch (fetched up to `before`, epoch seconds), or None."""
+    row = _reader().execute("SELECT kind, digest FROM snapshots WHERE ticker = ? AND source = ? AND name = ? "
+                            "AND fetched_at <= ? ORDER BY fetched_at DESC, id DESC LIMIT 1",
+                            (ticker.upper(), source, name, float("inf") if before is None else before)).fetchone()
+    if row is None:
+        return None
+    return read(row["digest"], row["kind"])
+
+
+# --- Replay ---
+# The replay state is a context variable: it follows an analysis into its fetch-graph threads
+# (asyncio.to_thread copies the context), and concurrent analyses can replay different dates.
+def _epoch(as_of):
+    if isinstance(as_of, datetime.datetime):
+        return as_of.timestamp()
+    if isinstance(as_of, datetime.date):
+        return datetime.datetime.combine(as_of, datetime.time.max).timestamp()  # the whole day
+    return float(as_of)
+
+
+def parse_sources(text):
+    """Replay sources from a command line value: "all" or comma-separated fetch-graph node names."""
+    sources = [source.strip() for source in text.split(",") if source.strip()]
+    if sources == ["all"]:
+        return REPLAY_SOURCES
+    unknown = sorted(set(sources) - set(REPLAY_SOURCES))
+    if unknown or not sources:
+        raise ValueError(f"Unknown replay sources {unknown}, expected 'all' or some of {REPLAY_SOURCES}")
+    return sources
+
+
+@contextlib.contextmanager
+def replaying(sources="all", as_of=None):
+    """
+    Within the block, capture() returns archived payloads for `sources` ("all" or fetch-graph node
+    names) instead of fetching, and nothing new is archived for them. With `as_of` (epoch seconds,
+    a datetime or a date) the newest payloads fetched up to then are used and today() is that date.
+
+        with snapshots.replaying(["yahoo", "finviz"], as_of=datetime.date(2025, 3, 31)):
+            results = await run_parallel_analysis("NVDA")
+    """
+    if sources == "all" or sources is None:
+        sources = None
+    else:
+        sources = frozenset(sources)
+        unknown = sources - set(REPLAY_SOURCES)
+        if unknown:
+            raise ValueError(f"Unknown replay sources {sorted(unknown)}, expected some of {REPLAY_SOURCES}")
+    token = _replay.set({"sources": sources, "as_of": None if as_of is None else _epoch(as_of)})
+    try:
+        yield
+    finally:
+        _replay.reset(token)
+
+
+def is_replayed(source):
+    state = _replay.get()
+    return state is not None and (state["sources"] is None or source in state["sources"])
+
+
+def replay_state():
+    """(sources, as_of) of the active replay (hashable, for cache keys), or None."""
+    state = _replay.get()
+    return None if state is None else (state["sources"], state["as_of"])
+
+
+def today():
+    """The analysis date: the replay's as_of date, otherwise today."""
+    state = _replay.get()
+    if state is not None and state["as_of"] is not None:
+        return datetime.date.fromtimestamp(state["as_of"])
+    return datetime.date.today()
+
+
+def pause(source, seconds):
+    """Sleeps before retrying a fetch, except while `source` is replayed (the retry reads the same payload)."""
+    if not is_replayed(source):
+        time.sleep(seconds)
+
+
+# --- Retention ---
+def prune(now=None):
+    """
+    Drops index rows older than their source's retention (the newest per ticker/source/name stays),
+    then deletes payloads no index row refers to. Returns (rows removed, payloads removed).
+    """
+    now = now or time.time()
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        removed_rows = 0
+        sources = [row["source"] for row in conn.execute("SELECT DISTINCT source FROM snapshots")]
+        for source in sources:
+            cutoff = now - RETENTION_DAYS.get(source, DEFAULT_RETENTION_DAYS) * 86400
+            removed_rows += conn.execute("""
+                DELETE FROM snapshots WHERE source = ? AND fetched_at < ? AND id NOT IN (
+                    SELECT id FROM (SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY ticker, source, name ORDER BY fetched_at DESC, id DESC) AS rn
+                    FROM snapshots WHERE source = ?) WHERE rn = 1)
+            """, (source, cutoff, source)).rowcount
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        conn.close()
+        raise
+    # Payloads are listed before the index is read, so one archived meanwhile is never taken for an orphan
+    store = get_store()
+    stored = list(store.digests())
+    try:
+        referenced = {row["digest"] for row in conn.execute("SELECT DISTINCT digest FROM snapshots")}
+    finally:
+        conn.close()
+    orphans = [digest for digest in stored if digest not in referenced]
+    for digest in orphans:
+        store.delete(digest)
+    return removed_rows, len(orphans)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Inspect and prune the raw source snapshot archive.")
+    parser.add_argument("--list", metavar="TICKER", help="List the snapshots of one ticker.")
+    parser.add_argument("--prune", action="store_true", help="Apply the retention policy.")
+    args = parser.parse_args()
+
+    if args.list:
+        rows = find(args.list)
+        rows["fetched_at"] = pd.to_datetime(rows["fetched_at"], unit="s")
+        print(rows.drop(columns=["id"]).to_string(index=False))
+    if args.prune:
+        removed_rows, removed_payloads = prune()
+        logger.info(f"Pruned {removed_rows} snapshots and {removed_payloads} payloads.")
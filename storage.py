@@ -0,0 +1,568 @@
+import re
+import time
+import uuid
+import logging
+import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from google.cloud import bigquery
+from google.api_core.exceptions import Conflict
+
+from bq_client import read_arrow, arrow_frame
+from scoring import SCORING_SPEC, TOTAL_POINTS, frame_from_records, score_frame, summarize_scores
+from metrics import metric, format_metric, NON_NUMERIC_UNITS
+
+DATASET_ID = st.secrets["DATASET_ID"]
+MASTER_TABLE_NAME = "master_table"
+HISTORY_TABLE_NAME = "analysis_history"
+LATEST_VIEW_NAME = "analysis_latest"
+# Load jobs tried under one job id family before append_history gives up
+MAX_LOAD_ATTEMPTS = 5
+
+# Long format: one row per metric (and per narrative text) of every saved analysis.
+# Partitioned by analysis date and clustered by ticker. Rows are only ever appended; the one exception
+# is write_scores (rescore.py), which restates the points of each ticker's latest analysis in place.
+HISTORY_SCHEMA = [
+    bigquery.SchemaField("analysis_id", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("analysis_date", "DATE", mode="REQUIRED"),
+    bigquery.SchemaField("saved_at", "TIMESTAMP", mode="REQUIRED"),
+    bigquery.SchemaField("ticker", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("metric", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("source", "STRING"),
+    bigquery.SchemaField("unit", "STRING"),
+    bigquery.SchemaField("value", "FLOAT64"),  # numeric units
+    bigquery.SchemaField("value_text", "STRING"),  # date / category units and narrative texts
+    bigquery.SchemaField("as_of", "DATE"),
+    bigquery.SchemaField("note", "STRING"),
+    bigquery.SchemaField("obtained_points", "FLOAT64"),
+    bigquery.SchemaField("total_points", "FLOAT64"),
+    bigquery.SchemaField("rejected", "BOOL"),
+    bigquery.SchemaField("content_hash", "STRING"),
+]
+HISTORY_COLUMNS = [field.name for field in HISTORY_SCHEMA]
+# Score summary stored with each master_table row at save time, so no view recomputes it
+SECTION_COLUMNS = {
+    "Financial Survival & Balance Sheet": "survival_score",
+    "Growth & Asymmetric Upside": "growth_score",
+    "Insider Alignment & Behavior": "insider_score",
+    "Moat & Qualitative Conviction": "moat_score",
+}
+SUMMARY_FIELDS = [*[(column, "FLOAT64") for column in SECTION_COLUMNS.values()], ("final_score", "FLOAT64"),
+                  ("rejected", "BOOL"), ("rejected_by", "STRING"), ("analysis_id", "STRING")]
+MASTER_SCHEMA = [
+    bigquery.SchemaField("Ticker", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("date", "DATE"),
+    bigquery.SchemaField("Score", "INT64"),
+    bigquery.SchemaField("Verdict", "STRING"),
+    *[bigquery.SchemaField(name, field_type) for name, field_type in SUMMARY_FIELDS],
+]
+
+LEGACY_MISSING_TEXT = ["n/a", "none", "", "nan", "error", "rejected"]
+LEGACY_MULTIPLIERS = [("trillion", 1e12), ("billion", 1e9), ("million", 1e6)]
+
+NARRATIVE_ROWS = {"Company Description": "description", "Value Proposition": "value_proposition",
+                  "Moat Analysis": "moat"}
+FILING_PERIOD_ROW = "FILING PERIOD"
+# Column projections of the history reads: only these columns are downloaded
+REPORT_COLUMNS = ["analysis_id", "analysis_date", "metric", "source", "unit", "value", "value_text", "as_of", "note",
+                  "content_hash"]
+DETAIL_COLUMNS = ["analysis_date", "metric", "source", "unit", "value", "value_text", "as_of", "note",
+                  "obtained_points", "total_points", "rejected"]
+
+# Past Analyses sort orders: label -> (master_table column, direction); ties are broken by Ticker
+MASTER_SORTS = {
+    "Newest first": ("date", "DESC"),
+    "Oldest first": ("date", "ASC"),
+    "Highest score": ("Score", "DESC"),
+    "Lowest score": ("Score", "ASC"),
+    "Ticker A-Z": ("Ticker", "ASC"),
+}
+
+# Concurrent DML on the same table can abort with a serialization error; the loser is retried
+DML_RETRIES = 3
+# Keyed by (id(client), path): the BigQuery client and the local mirror share table paths
+_master_date_types = {}
+_ensured_datasets = set()
+
+logger = logging.getLogger(__name__)
+
+
+def dataset_path(client):
+    return DATASET_ID if "." in DATASET_ID else f"{client.project}.{DATASET_ID}"
+
+
+def table_path(client, table_name):
+    return f"{dataset_path(client)}.{table_name}"
+
+
+def ticker_table_name(ticker):
+    """Per-ticker detail table name (BigQuery table names cannot contain '-' or '.')."""
+    return ticker.strip().upper().replace("-", "_").replace(".", "_")
+
+
+def parse_stored_values(metric_name, texts):
+    """
+    Vectorized parse of legacy formatted 'Value' strings (e.g. '1.23 Billion', '12.50 Months',
+    'Positive OCF (No Burn)') back into the scoring input for one metric.
+    Category and date metrics are returned as text.
+    """
+    texts = pd.Series(texts, dtype="string").str.strip()
+    missing = texts.isna() | texts.str.lower().isin(LEGACY_MISSING_TEXT)
+    rule = SCORING_SPEC.get(metric_name, {})
+    if "keywords" in rule or "transform" in rule:
+        return texts.mask(missing, None).astype(object)
+
+    low = texts.str.lower().fillna("")
+    numbers = pd.to_numeric(
+        texts.str.replace(",", "", regex=False).str.extract(r"(-?\d+(?:\.\d+)?)", expand=False), errors="coerce")
+    multiplier = np.select([low.str.contains(word, regex=False).to_numpy() for word, _ in LEGACY_MULTIPLIERS],
+                           [m for _, m in LEGACY_MULTIPLIERS], default=1.0)
+    values = numbers.to_numpy(dtype="float64") * multiplier
+    no_burn = (low.str.contains("positive ocf", regex=False) | low.str.contains("no burn", regex=False)).to_numpy()
+    values = np.where(no_burn, np.inf, values)
+    return pd.Series(np.where(missing.to_numpy(), np.nan, values), index=texts.index)
+
+
+def _master_date_type(client, table):
+    """STRING or DATE: older master tables stored the analysis date as text."""
+    key = (id(client), table)
+    if key not in _master_date_types:
+        field = next((f for f in client.get_table(table).schema if f.name == "date"), None)
+        _master_date_types[key] = field.field_type if field is not None else "STRING"
+    return _master_date_types[key]
+
+
+def query_master_page(client, search="", sort="Newest first", after=None, page_size=50):
+    """
+    One page of master_table rows, filtered and sorted server-side.
+    `search` is a ticker prefix; `after` is the keyset cursor (sort value, Ticker) of the previous
+    page's last row, so every page is a bounded indexed read however deep it is.
+    Returns (rows as an Arrow table, next_cursor); next_cursor is None on the last page.
+    """
+    column, direction = MASTER_SORTS[sort]
+    master = table_path(client, MASTER_TABLE_NAME)
+    # Tickers only contain letters, digits, '.' and '-', which also keeps LIKE wildcards out
+    prefix = re.sub(r"[^A-Z0-9.\-]", "", (search or "").upper())
+    params = [bigquery.ScalarQueryParameter("pattern", "STRING", f"{prefix}%"),
+              bigquery.ScalarQueryParameter("limit", "INT64", page_size + 1)]
+    keyset = ""
+    if after is not None:
+        after_value, after_ticker = after
+        params.append(bigquery.ScalarQueryParameter("after_ticker", "STRING", after_ticker))
+        if column == "Ticker":
+            keyset = "AND Ticker > @after_ticker"
+        else:
+            value_type = _master_date_type(client, master) if column == "date" else "INT64"
+            params.append(bigquery.ScalarQueryParameter("after_value", value_type, after_value))
+            op = "<" if direction == "DESC" else ">"
+            keyset = f"AND ({column} {op} @after_value OR ({column} = @after_value AND Ticker > @after_ticker))"
+    order = "Ticker" if column == "Ticker" else f"{column} {direction}, Ticker"
+    sql = f"""
+        SELECT Ticker, date, Score, Verdict FROM `{master}`
+        WHERE UPPER(Ticker) LIKE @pattern {keyset}
+        ORDER BY {order}
+        LIMIT @limit
+    """
+    rows = read_arrow(client, sql, params)
+    if rows.num_rows <= page_size:
+        return rows, None
+    rows = rows.slice(0, page_size)
+    last_value = rows[column][-1].as_py()
+    if column == "date":
+        last_value = pd.Timestamp(last_value).date() if _master_date_type(client, master) == "DATE" \
+            else str(last_value)[:10]
+    elif column == "Score":
+        last_value = int(last_value)
+    return rows, (last_value, rows["Ticker"][-1].as_py())
+
+
+def summary_fields(summary, rejected_by, analysis_id=None):
+    """The master_table summary columns of one score summary (dict or summarize_scores row)."""
+    fields = {column: float(summary[section]) for section, column in SECTION_COLUMNS.items()}
+    fields.update(final_score=float(summary["Final Score"]), rejected=bool(summary["Rejected"]),
+                  rejected_by=", ".join(rejected_by), analysis_id=analysis_id)
+    return fields
+
+
+def master_row(ticker, report, analysis_date=None):
+    """The master_table row of a finished report (see build_report)."""
+    summary = report["score_summary"]
+    rejected_by = [r["Metric Name"] for r in report["report_rows"] if r["Rejected"]]
+    return {"ticker": ticker, "score": int(float(summary["Final Score"])), "verdict": summary["Verdict"],
+            "date": analysis_date or datetime.date.today(),
+            **summary_fields(summary, rejected_by, report.get("analysis_id"))}
+
+
+def _summary_parameters(fields):
+    return [bigquery.ScalarQueryParameter(name, field_type, fields[name]) for name, field_type in SUMMARY_FIELDS]
+
+
+def upsert_master_rows(client, rows):
+    """
+    Inserts or updates master_table rows with one parameterized MERGE (a single job, atomic under
+    concurrent saves). `rows` are master_row dicts; the newest per ticker wins, and a save never
+    replaces a row from a newer analysis date.
+    """
+    ensure_history_table(client)
+    master = table_path(client, MASTER_TABLE_NAME)
+    date_type = _master_date_type(client, master)
+    latest = {}
+    for row in rows:
+        if row["ticker"] not in latest or latest[row["ticker"]]["date"] <= row["date"]:
+            latest[row["ticker"]] = row
+    if not latest:
+        return
+    params = [
+        bigquery.StructQueryParameter(
+            None,
+            bigquery.ScalarQueryParameter("ticker", "STRING", row["ticker"]),
+            bigquery.ScalarQueryParameter("score", "INT64", row["score"]),
+            bigquery.ScalarQueryParameter("verdict", "STRING", row["verdict"]),
+            bigquery.ScalarQueryParameter("date", date_type,
+                                          row["date"] if date_type == "DATE" else row["date"].strftime("%Y-%m-%d")),
+            *_summary_parameters(row),
+        )
+        for row in latest.values()
+    ]
+    summary_names = [name for name, _ in SUMMARY_FIELDS]
+    merge_sql = f"""
+        MERGE `{master}` m
+        USING (SELECT * FROM UNNEST(@rows)) r
+        ON m.Ticker = r.ticker
+        WHEN MATCHED AND m.date <= r.date THEN UPDATE SET Score = r.score, Verdict = r.verdict, date = r.date,
+            {", ".join(f"{name} = r.{name}" for name in summary_names)}
+        WHEN NOT MATCHED THEN INSERT (Ticker, Score, Verdict, date, {", ".join(summary_names)})
+            VALUES (r.ticker, r.score, r.verdict, r.date, {", ".join(f"r.{name}" for name in summary_names)})
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ArrayQueryParameter("rows", "STRUCT", params)])
+    for attempt in range(DML_RETRIES):
+        try:
+            client.query(merge_sql, job_config=job_config).result()
+            return
+        except Exception as e:
+            if "concurrent update" not in str(e) or attempt == DML_RETRIES - 1:
+                raise
+            logger.warning(f"master_table MERGE of {len(latest)} rows hit a concurrent update, retrying")
+            time.sleep(1 + attempt)
+
+
+def upsert_master(client, ticker, report, analysis_date=None):
+    """Inserts or updates one ticker's master_table row (see upsert_master_rows)."""
+    upsert_master_rows(client, [master_row(ticker, report, analysis_date)])
+
+
+def load_summary(client, ticker):
+    """
+    The stored score summary of the ticker's latest analysis, read from its master_table row alone:
+    {section: points, "Final Score", "Rejected", "Rejected by", "Verdict", "date"}, or None.
+    """
+    ensure_history_table(client)
+    columns = ", ".join(["date", "Verdict", *(name for name, _ in SUMMARY_FIELDS)])
+    rows = arrow_frame(read_arrow(client, f"SELECT {columns} FROM `{table_path(client, MASTER_TABLE_NAME)}` "
+                                          f"WHERE Ticker = @ticker LIMIT 1",
+                                  [bigquery.ScalarQueryParameter("ticker", "STRING", ticker)]))
+    if rows.empty:
+        return None
+    row = rows.iloc[0]
+    if not _present(row["final_score"]):
+        return _summary_from_history(client, ticker, row)
+    summary = {section: float(row[column]) for section, column in SECTION_COLUMNS.items()}
+    summary.update({"Final Score": float(row["final_score"]), "Rejected": bool(row["rejected"]),
+                    "Rejected by": [name for name in (row["rejected_by"] or "").split(", ") if name],
+                    "Verdict": row["Verdict"], "date": str(row["date"])[:10]})
+    return summary
+
+
+def _summary_from_history(client, ticker, row):
+    """Scores a master row saved before the summary columns existed (until rescore backfills it)."""
+    stored = load_stored_report(client, ticker)
+    if stored is None:
+        return None
+    values = frame_from_records({ticker: stored["records"]})
+    points, rejected = score_frame(values, as_of=pd.Series({ticker: stored["date"]}))
+    summary = summarize_scores(points, rejected).loc[ticker].to_dict()
+    summary["Rejected by"] = list(rejected.columns[rejected.loc[ticker].to_numpy(bool)])
+    summary["Verdict"] = row["Verdict"]
+    summary["date"] = str(row["date"])[:10]
+    return summary
+
+
+def ensure_history_table(client):
+    """Creates the history table, its latest-per-ticker view and master_table if they do not exist yet (once per process)."""
+    if (id(client), dataset_path(client)) in _ensured_datasets:
+        return
+    master = table_path(client, MASTER_TABLE_NAME)
+    client.create_table(bigquery.Table(master, schema=MASTER_SCHEMA), exists_ok=True)
+    # Older master tables predate the stored summary columns
+    existing = {field.name for field in client.get_table(master).schema}
+    for name, field_type in SUMMARY_FIELDS:
+        if name not in existing:
+            client.query(f"ALTER TABLE `{master}` ADD COLUMN IF NOT EXISTS {name} {field_type}").result()
+    history_path = table_path(client, HISTORY_TABLE_NAME)
+    history = bigquery.Table(history_path, schema=HISTORY_SCHEMA)
+    history.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY,
+                                                          field="analysis_date")
+    history.clustering_fields = ["ticker"]
+    client.create_table(history, exists_ok=True)
+    # Column projections need the columns added since the table was first created (content_hash)
+    existing = {field.name for field in client.get_table(history_path).schema}
+    for field in HISTORY_SCHEMA:
+        if field.name not in existing:
+            client.query(f"ALTER TABLE `{history_path}` ADD COLUMN IF NOT EXISTS {field.name} {field.field_type}") \
+                .result()
+    client.query(f"""
+        CREATE VIEW IF NOT EXISTS `{table_path(client, LATEST_VIEW_NAME)}` AS
+        SELECT * FROM `{table_path(client, HISTORY_TABLE_NAME)}`
+        WHERE TRUE
+        QUALIFY saved_at = MAX(saved_at) OVER (PARTITION BY ticker)
+    """).result()
+    _ensured_datasets.add((id(client), dataset_path(client)))
+
+
+def history_rows(ticker, report_rows, risk_reward, llm_data, filing_period=None, analysis_id=None,
+                 content_hash=None):
+    """Typed history rows of one analysis: one per report metric plus the narrative and filing-period texts."""
+    saved_at = datetime.datetime.now(datetime.timezone.utc)
+    base = {**dict.fromkeys(HISTORY_COLUMNS), "analysis_id": analysis_id or uuid.uuid4().hex,
+            "analysis_date": datetime.date.today(), "saved_at": saved_at, "ticker": ticker,
+            "content_hash": content_hash}
+    rows = []
+    for r in report_rows:
+        record = r["Value"]
+        if r["Metric Name"] == "TOTAL" or record is None:
+            continue
+        numeric = record.unit not in NON_NUMERIC_UNITS
+        rows.append({**base, "metric": r["Metric Name"], "source": record.source, "unit": record.unit,
+                     "value": record.value if numeric else None,
+                     "value_text": None if numeric or record.value is None else str(record.value),
+                     "as_of": datetime.date.fromisoformat(record.as_of[:10]) if record.as_of else None,
+                     "note": record.note, "obtained_points": r["Obtained points"],
+                     "total_points": r["Total points"], "rejected": r["Rejected"]})
+
+    texts = {"Risks": "\n".join(risk_reward.get("risks", [])), "Rewards": "\n".join(risk_reward.get("rewards", []))}
+    texts.update({row_name: llm_data.get(key, "N/A") for row_name, key in NARRATIVE_ROWS.items()})
+    # Latest statement period, used by refreshes to detect new filings
+    texts[FILING_PERIOD_ROW] = filing_period
+    rows.extend({**base, "metric": row_name, "unit": "text", "value_text": text} for row_name, text in texts.items())
+    return pd.DataFrame(rows, columns=HISTORY_COLUMNS)
+
+
+def append_history(client, rows, job_id=None):
+    """
+    Appends history rows with a load job (no per-row DML, no streaming buffer).
+    With a `job_id` the append is idempotent: BigQuery refuses a second job with the same id,
+    so a repeated save of the same analysis is a no-op. Returns False in that case.
+    If the job under that id failed, the load is retried as `<job_id>_1`, `<job_id>_2`, ...,
+    each checked the same way, so the rows land exactly once however often this is called.
+    """
+    ensure_history_table(client)
+    job_config = bigquery.LoadJobConfig(write_disposition="WRITE_APPEND", schema=HISTORY_SCHEMA)
+    path = table_path(client, HISTORY_TABLE_NAME)
+    if job_id is None:
+        client.load_table_from_dataframe(rows, path, job_config=job_config).result()
+        return True
+    for attempt in range(MAX_LOAD_ATTEMPTS):
+        attempt_id = job_id if attempt == 0 else f"{job_id}_{attempt}"
+        try:
+            client.load_table_from_dataframe(rows, path, job_id=attempt_id, job_config=job_config).result()
+            return True
+        except Conflict:
+            try:
+                client.get_job(attempt_id).result()  # waits if it is still running, raises if it failed
+            except Exception as e:
+                logger.warning(f"History load job {attempt_id} failed earlier ({e}), retrying")
+                continue
+            logger.info(f"History load job {attempt_id} already ran, skipping the duplicate save")
+            return False
+    raise RuntimeError(f"History load {job_id} failed {MAX_LOAD_ATTEMPTS} times, giving up")
+
+
+def delete_analyses(client, ticker):
+    """Deletes the ticker's analysis history and its master_table row."""
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("ticker", "STRING", ticker)])
+    client.query(f"DELETE FROM `{table_path(client, HISTORY_TABLE_NAME)}` WHERE ticker = @ticker",
+                 job_config=job_config).result()
+    client.query(f"DELETE FROM `{table_path(client, MASTER_TABLE_NAME)}` WHERE Ticker = @ticker",
+                 job_config=job_config).result()
+
+
+def load_latest_table(client, tickers=None, columns=None):
+    """History rows of the latest analysis of each ticker (or of the given tickers) as an Arrow table."""
+    sql = f"SELECT {', '.join(columns) if columns else '*'} FROM `{table_path(client, LATEST_VIEW_NAME)}`"
+    params = []
+    if tickers is not None:
+        sql += " WHERE ticker IN UNNEST(@tickers)"
+        params.append(bigquery.ArrayQueryParameter("tickers", "STRING", list(tickers)))
+    return read_arrow(client, sql, params)
+
+
+def load_latest_rows(client, tickers=None, columns=None):
+    """load_latest_table as a DataFrame."""
+    return arrow_frame(load_latest_table(client, tickers, columns))
+
+
+def _present(value):
+    return value is not None and not (pd.api.types.is_scalar(value) and pd.isna(value))
+
+
+def record_from_row(row):
+    """Revives one typed history row into a MetricRecord."""
+    value = row["value_text"] if row["unit"] in NON_NUMERIC_UNITS else row["value"]
+    as_of = row["as_of"] if _present(row["as_of"]) else row["analysis_date"]
+    return metric(value if _present(value) else None, row["unit"], row["source"] or "", as_of,
+                  row["note"] if _present(row["note"]) else None)
+
+
+def load_stored_analyses(client):
+    """
+    Reads the master list plus the typed metric values of each ticker's latest analysis.
+    Returns (master, values): master rows indexed by ticker (with the stored final score, section
+    subtotals and latest analysis_id) and the metric values (tickers x metrics).
+    """
+    master = arrow_frame(read_arrow(client, f"SELECT Ticker, date, Score, Verdict, final_score, "
+                                            f"{', '.join(SECTION_COLUMNS.values())} "
+                                            f"FROM `{table_path(client, MASTER_TABLE_NAME)}`"))
+    if master.empty:
+        return master, pd.DataFrame()
+    master = master.drop_duplicates("Ticker").set_index("Ticker")
+
+    rows = arrow_frame(read_arrow(client, f"""
+        SELECT ticker, analysis_id, analysis_date, metric, unit, value, value_text
+        FROM `{table_path(client, LATEST_VIEW_NAME)}`
+        WHERE unit != 'text'
+    """))
+    rows = rows[rows["ticker"].isin(master.index)]
+    if rows.empty:
+        return master.iloc[0:0], pd.DataFrame()
+    latest = rows.drop_duplicates("ticker").set_index("ticker")
+    master = master.loc[latest.index].rename_axis("Ticker")
+    master["analysis_id"] = latest["analysis_id"]
+    master["analysis_date"] = latest["analysis_date"]
+
+    text_units = rows["unit"].isin(NON_NUMERIC_UNITS)
+    numeric = rows[~text_units].pivot(index="ticker", columns="metric", values="value").astype("float64")
+    text = rows[text_units].pivot(index="ticker", columns="metric", values="value_text").astype(object)
+    values = pd.concat([numeric, text.where(text.notna(), None)], axis=1).reindex(latest.index)
+    values.index.name = "Ticker"
+    return master, values
+
+
+def write_scores(client, master, summary, points, rejected):
+    """
+    Writes re-computed scores back in bulk: one MERGE for master_table (score, verdict and the
+    stored summary columns) and one UPDATE restating the points on the rows of each ticker's
+    latest analysis. That UPDATE is the only in-place change to the otherwise append-only history:
+    metric values are never touched, only the points derived from them.
+    """
+    ensure_history_table(client)
+    master_rows = [
+        bigquery.StructQueryParameter(
+            None,
+            bigquery.ScalarQueryParameter("ticker", "STRING", ticker),
+            bigquery.ScalarQueryParameter("score", "INT64", int(row["Final Score"])),
+            bigquery.ScalarQueryParameter("verdict", "STRING", row["Verdict"]),
+            *_summary_parameters(summary_fields(row, list(rejected.columns[rejected.loc[ticker].to_numpy(bool)]),
+                                                master.at[ticker, "analysis_id"])),
+        )
+        for ticker, row in summary.iterrows()
+    ]
+    merge_sql = f"""
+        MERGE `{table_path(client, MASTER_TABLE_NAME)}` m
+        USING (SELECT * FROM UNNEST(@rows)) r
+        ON m.Ticker = r.ticker
+        WHEN MATCHED THEN UPDATE SET Score = r.score, Verdict = r.verdict,
+            {", ".join(f"{name} = r.{name}" for name, _ in SUMMARY_FIELDS)}
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ArrayQueryParameter("rows", "STRUCT", master_rows)])
+    client.query(merge_sql, job_config=job_config).result()
+
+    score_rows = pd.DataFrame({"obtained": points.stack(), "rejected": rejected.stack()}) \
+        .fillna({"rejected": False}).reset_index()
+    score_rows.columns = ["Ticker", "metric", "obtained", "rejected"]
+    score_rows["total"] = score_rows["metric"].map(lambda m: TOTAL_POINTS.get(m, 0.0))
+    score_rows["analysis_id"] = score_rows["Ticker"].map(master["analysis_id"])
+    params = [
+        bigquery.StructQueryParameter(
+            None,
+            bigquery.ScalarQueryParameter("analysis_id", "STRING", r.analysis_id),
+            bigquery.ScalarQueryParameter("metric", "STRING", r.metric),
+            bigquery.ScalarQueryParameter("obtained", "FLOAT64", float(r.obtained) if r.total and pd.notna(r.obtained)
+                                          else None),
+            bigquery.ScalarQueryParameter("total", "FLOAT64", float(r.total)),
+            bigquery.ScalarQueryParameter("rejected", "BOOL", bool(r.rejected)),
+        )
+        for r in score_rows.itertuples(index=False)
+    ]
+    dates = [pd.Timestamp(d).date() for d in master.loc[summary.index, "analysis_date"].unique()]
+    update_sql = f"""
+        UPDATE `{table_path(client, HISTORY_TABLE_NAME)}` h
+        SET obtained_points = s.obtained, total_points = s.total, rejected = s.rejected
+        FROM UNNEST(@scores) s
+        WHERE h.analysis_date IN UNNEST(@dates) AND h.analysis_id = s.analysis_id AND h.metric = s.metric
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ArrayQueryParameter("scores", "STRUCT", params),
+                                                           bigquery.ArrayQueryParameter("dates", "DATE", dates)])
+    client.query(update_sql, job_config=job_config).result()
+
+
+def load_stored_report(client, ticker):
+    """
+    The last saved analysis of one ticker revived into report inputs, or None if there is none.
+    Returns {"date", "records" ({metric name: MetricRecord}, including the ones saved without a value,
+    so missing and rejected rows survive a reload), "llm_analysis", "risk_reward", "filing_period", "analysis_id", "content_hash"}.
+    """
+    ensure_history_table(client)
+    rows = load_latest_rows(client, [ticker], REPORT_COLUMNS)
+    if rows.empty:
+        return None
+    analysis_date = str(rows["analysis_date"].iloc[0])[:10]
+    analysis_id = rows["analysis_id"].iloc[0]
+    stored_hash = rows["content_hash"].iloc[0]
+
+    records = {}
+    texts = {}
+    for row in rows.to_dict("records"):
+        if row["unit"] == "text":
+            texts[row["metric"]] = row["value_text"] if _present(row["value_text"]) else None
+            continue
+        records[row["metric"]] = record_from_row(row)
+
+    llm_analysis = {"description": "N/A", "value_proposition": "N/A", "moat": "N/A",
+                    "ceo_ownership": records.get("CEO Ownership %", metric(None, "percent", "Perplexity")),
+                    "classification": records.get("Business Model & Value Proposition",
+                                                  metric(None, "category", "Perplexity"))}
+    for row_name, key in NARRATIVE_ROWS.items():
+        if texts.get(row_name) and texts[row_name].strip():
+            llm_analysis[key] = texts[row_name]
+    risk_reward = {key: [line for line in (texts.get(row_name) or "").split("\n") if line.strip()]
+                   for row_name, key in [("Rewards", "rewards"), ("Risks", "risks")]}
+    return {"date": analysis_date, "records": records, "llm_analysis": llm_analysis, "risk_reward": risk_reward,
+            "filing_period": texts.get(FILING_PERIOD_ROW) or None, "analysis_id": analysis_id,
+            "content_hash": stored_hash if _present(stored_hash) else None}
+
+
+def detail_frame(rows):
+    """
+    One ticker's latest history rows (an Arrow table of DETAIL_COLUMNS) in the Past Analyses detail
+    layout (Matric name / Source / Value / Obtained Score / Total score / LLM, plus a DATE row).
+    """
+    if rows is None or rows.num_rows == 0:
+        return pd.DataFrame()
+    rows = arrow_frame(rows)
+    detail = []
+    for row in rows.to_dict("records"):
+        if row["unit"] == "text":
+            detail.append({"Matric name": row["metric"], "LLM": row["value_text"]})
+            continue
+        total = row["total_points"] if _present(row["total_points"]) else 0
+        if _present(row["rejected"]) and bool(row["rejected"]):
+            obtained = "rejected"
+        else:
+            obtained = f"{row['obtained_points']:g}" if total and _present(row["obtained_points"]) else ""
+        detail.append({"Matric name": row["metric"], "Source": row["source"],
+                       "Value": format_metric(record_from_row(row)), "Obtained Score": obtained,
+                       "Total score": f"{total:g}" if total else "", "LLM": None})
+    detail.append({"Matric name": "DATE", "LLM": str(rows["analysis_date"].iloc[0])[:10]})
+    return pd.DataFrame(detail, columns=["Matric name", "Source", "Value", "Obtained Score", "Total score", "LLM"])
@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import logging
+import threading
+import multiprocessing
+
+import job_queue
+from metrics import to_json, from_json
+from pipeline import run_parallel_analysis, build_report
+from bq_client import get_client
+from storage import load_stored_report
+from persistence import PersistenceBuffer, save_analysis
+from batch import run_batch
+
+# --- WINDOWS ASYNCIO FIX ---
+if sys.platform == 'win32':
+    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+
+POLL_INTERVAL = 2.0
+HEARTBEAT_INTERVAL = 10.0
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def run_job(job):
+    """
+    Runs one analysis and returns the JSON-encoded result stored on the job,
+    or None when no report could be built (the fetchers already retried).
+    Refresh jobs start from the stored report and only fetch its stale parts; "unchanged" tells
+    whether the refreshed report hashes the same as the stored one.
+    """
+    ticker = job["ticker"]
+    stored = None
+    if job["params"].get("refresh"):
+        client = get_client()
+        stored = load_stored_report(client, ticker) if client else None
+    results = asyncio.run(run_parallel_analysis(ticker, full_report=job["params"].get("full_report", False),
+                                                stored=stored))
+    report = build_report(ticker, results)
+    if report is None:
+        return None
+    return to_json({"report": report, "gate_rejections": results["gate_rejections"], "skipped": results["skipped"],
+                    "reused": results["reused"],
+                    "unchanged": stored is not None and stored["content_hash"] == report["content_hash"]})
+
+
+def run_batch_job(job):
+    """
+    Screens a watchlist job with run_batch and returns the results table as JSON records. The
+    checkpoint makes a re-claimed job resume where it stopped; with "save" the analyses are saved
+    in bulk through a PersistenceBuffer while the batch runs.
+    """
+    params = job["params"]
+    client = get_client() if params.get("save") else None
+    buffer = PersistenceBuffer(client) if client else None
+    try:
+        table = asyncio.run(run_batch(params["tickers"], params["checkpoint"],
+                                      full_report=params.get("full_report", False), buffer=buffer))
+    finally:
+        if buffer is not None:
+            buffer.close()
+    return table.to_json(orient="records")
+
+
+def save_job_result(conn, job):
+    """
+    Saves a finished job's analysis to BigQuery and records the outcome on the job. A refresh that
+    reproduced the stored analysis is not saved again. Returns True once the analysis is stored.
+    """
+    if job_queue.is_batch(job):  # saved through its PersistenceBuffer while it ran
+        job_queue.mark_saved(conn, job["id"])
+        return True
+    job_queue.save_started(conn, job["id"])
+    result = from_json(job["result"])
+    try:
+        if not result.get("unchanged"):
+            client = get_client()
+            if client is None:
+                raise RuntimeError("BigQuery client could not be created")
+            save_analysis(client, job["ticker"], result["report"])
+    except Exception as e:
+        logging.error(f"Saving job {job['id']} ({job['ticker']}) failed, an idle worker retries it: {e}")
+        job_queue.save_failed(conn, job["id"], e)
+        return False
+    job_queue.mark_saved(conn, job["id"])
+    return True
+
+
+def _keep_alive(job_id, worker_id, stop):
+    """Renews the job lease and the worker heartbeat until `stop` is set (own connection: sqlite is per-thread)."""
+    conn = job_queue.connect()
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        job_queue.worker_heartbeat(conn, worker_id)
+        if not job_queue.renew_lease(conn, job_id, worker_id):
+            logging.warning(f"{worker_id} lost the lease on job {job_id}")
+            break
+    conn.close()
+
+
+def worker_loop(worker_id, poll_interval=POLL_INTERVAL):
+    """Claims and runs jobs until interrupted."""
+    conn = job_queue.connect()
+    logging.info(f"Worker {worker_id} started ({job_queue.QUEUE_PATH})")
+    try:
+        while True:
+            job_queue.worker_heartbeat(conn, worker_id)
+            job = job_queue.claim(conn, worker_id)
+            if job is None:
+                unsaved = job_queue.claim_unsaved(conn)
+                if unsaved is None:
+                    time.sleep(poll_interval)
+                else:
+                    save_job_result(conn, unsaved)
+                continue
+
+            logging.info(f"{worker_id} running job {job['id']} ({job['ticker']}, attempt {job['attempts']})")
+            stop = threading.Event()
+            keeper = threading.Thread(target=_keep_alive, args=(job["id"], worker_id, stop), daemon=True)
+            keeper.start()
+            try:
+                result = run_batch_job(job) if job_queue.is_batch(job) else run_job(job)
+                if result is None:
+                    job_queue.fail(conn, job["id"], worker_id, "no fundamentals from Yahoo Finance / Alpha Vantage",
+                                   retry=False)
+                elif job_queue.complete(conn, job["id"], worker_id, result):
+                    save_job_result(conn, {**job, "result": result})
+            except Exception as e:
+                logging.error(f"Job {job['id']} failed: {e}")
+                job_queue.fail(conn, job["id"], worker_id, e)
+            finally:
+                stop.set()
+                keeper.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        job_queue.worker_exit(conn, worker_id)
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run analysis workers for the local job queue.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes.")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    args = parser.parse_args()
+
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    if args.workers == 1:
+        worker_loop(f"{prefix}-0", args.poll_interval)
+    else:
+        processes = [multiprocessing.Process(target=worker_loop, args=(f"{prefix}-{i}", args.poll_interval))
+                     for i in range(args.workers)]
+        for p in processes:
+            p.start()
+        try:
+            for p in processes:
+                p.join()
+        except KeyboardInterrupt:
+            for p in processes:
+                p.join()
@@ -1,62 +1,174 @@
 import yfinance as yf
 import pandas as pd
-from datetime import datetime
-import time
 import logging
 import streamlit as st
 import requests
 import json
-import sys
 import os
 
+import snapshots
+from share_count_store import get_share_history, share_count_cagr
+from metrics import metric
+from financials import (normalize_yahoo, normalize_alpha_vantage, merge_statements, missing_fields,
+                        alpha_vantage_functions_for, latest, ttm, yoy)
+
 # --- API Key from Secrets ---
 ALPHA_VANTAGE_KEY = st.secrets["ALPHA_VANTAGE_API_KEY_3"]
 
 # --- Configured logging to track errors and retries ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def format_large_number(num):
-    """
-    Converts numbers to strings in Millions, Billions, or Trillions.
-    """
-    if num is None or not isinstance(num, (int, float)):
-        return "N/A"
-
-    abs_num = abs(num)
-    if abs_num >= 1_000_000_000_000:
-        return f"{num / 1_000_000_000_000:.2f} Trillion"
-    elif abs_num >= 1_000_000_000:
-        return f"{num / 1_000_000_000:.2f} Billion"
-    elif abs_num >= 1_000_000:
-        return f"{num / 1_000_000:.2f} Million"
-    else:
-        return f"{num:.2f}"
-
-def get_latest_metric(df, possible_keys):
+# Canonical fields each statement frame must provide before Alpha Vantage is consulted
+QUARTERLY_REQUIRED = ["total_assets", "total_liabilities", "cash", "operating_cash_flow", "free_cash_flow"]
+ANNUAL_REQUIRED = ["ebitda", "net_debt"]
+ANNUAL_YOY_REQUIRED = ["total_revenue", "ebit"]
+
+
+def fetch_alpha_vantage(function, ticker_symbol, proxies):
     """
-    Searches for the first matching key in the dataframe and returns
-    the value from the most recent period.
+    Fetches one Alpha Vantage endpoint (e.g. OVERVIEW, BALANCE_SHEET) and returns the JSON payload.
     """
-    if df is None or df.empty:
-        return None, None
-    for key in possible_keys:
-        if key in df.index:
-            try:
-                val = df.loc[key].iloc[0]
-                if pd.notnull(val):
-                    return val, key
-            except (IndexError, AttributeError):
-                continue
-    return None, None
+    url = f"https://www.alphavantage.co/query?function={function}&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
+    return snapshots.capture(ticker_symbol, "yahoo", f"alpha_vantage/{function}",
+                             lambda: requests.get(url, proxies=proxies, timeout=15).json())
 
-def run_comprehensive_analysis(ticker_symbol):
+
+def yahoo_payload(ticker_symbol, name, fetch):
+    """One raw yfinance read (info, a statement, ...), archived with the analysis snapshots."""
+    return snapshots.capture(ticker_symbol, "yahoo", name, fetch)
+
+
+def get_proxy_url():
     # Proxy Configuration from first code
     PROXY_USER = st.secrets["PROXY_USER"]
     PROXY_PASS = st.secrets["PROXY_PASS"]
     PROXY_HOST = "gw.dataimpulse.com"
     PROXY_PORT = "823"
-    proxy_url = f"http://{PROXY_USER}:{PROXY_PASS}@{PROXY_HOST}:{PROXY_PORT}"
-    
+    return f"http://{PROXY_USER}:{PROXY_PASS}@{PROXY_HOST}:{PROXY_PORT}"
+
+
+# Helper to clean Alpha Vantage string values from second code
+def av_clean(val):
+    try:
+        return float(val) if val and str(val).lower() != "none" else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def alpha_vantage_getter(ticker_symbol, proxies):
+    """Returns av_get(function): each Alpha Vantage endpoint is requested at most once per analysis."""
+    av_payloads = {}
+
+    def av_get(function):
+        if function not in av_payloads:
+            try:
+                av_payloads[function] = fetch_alpha_vantage(function, ticker_symbol, proxies) or {}
+            except Exception as e:
+                logging.error(f"Alpha Vantage {function} request failed for {ticker_symbol}: {e}")
+                av_payloads[function] = {}
+        return av_payloads[function]
+
+    return av_get
+
+
+def quote_metrics(ticker_symbol, ticker, info, av_get):
+    """
+    Market-driven metrics: price, market cap, shares, 52 week range, latest option expiry and
+    insider ownership (Yahoo Finance primary, Alpha Vantage backup).
+    """
+    quote_source = "Yahoo Finance"
+    insider_source = "Yahoo Finance"
+
+    # 1. Price, Low, High, Market Cap (YFinance primary)
+    current_price = info.get('currentPrice') or info.get('regularMarketPrice')
+    market_cap = info.get('marketCap')
+    shares_outstanding = info.get('sharesOutstanding')
+    low_52 = info.get('fiftyTwoWeekLow')
+    high_52 = info.get('fiftyTwoWeekHigh')
+
+    # --- Alpha Vantage Backup for Price/Cap/Shares/Range (from second code) ---
+    if not current_price or not market_cap:
+        logging.info(f"Price/Cap missing in YF for {ticker_symbol}. Checking Alpha Vantage...")
+        quote_source = "Alpha Vantage"
+        ov_data = av_get("OVERVIEW")
+        if not current_price:
+            gq_data = av_get("GLOBAL_QUOTE").get("Global Quote", {})
+            current_price = av_clean(gq_data.get("05. price"))
+        if not market_cap:
+            market_cap = av_clean(ov_data.get("MarketCapitalization"))
+        if not shares_outstanding:
+            shares_outstanding = av_clean(ov_data.get("SharesOutstanding"))
+        if not low_52:
+            low_52 = av_clean(ov_data.get("52WeekLow"))
+        if not high_52:
+            high_52 = av_clean(ov_data.get("52WeekHigh"))
+
+    # 4. Latest expiration date
+    try:
+        options = yahoo_payload(ticker_symbol, "options", lambda: list(ticker.options))
+        latest_expiry = options[-1] if options else None
+    except Exception:
+        latest_expiry = None
+
+    # 5. Total insider ownership % (YF primary, AV Backup from second code)
+    insider_own_pct = info.get('heldPercentInsiders')
+    if insider_own_pct is None:
+        ov_data = av_get("OVERVIEW")
+        insider_own_pct = av_clean(ov_data.get("PercentInsiders")) / 100.0 if ov_data.get("PercentInsiders") else None
+        insider_source = "Alpha Vantage"
+
+    return {
+        "Current stock price": metric(current_price or None, "price", quote_source),
+        "Market cap": metric(market_cap or None, "usd", quote_source),
+        "Shares Outstanding": metric(shares_outstanding or None, "count", quote_source),
+        "52 week low": metric(low_52 or None, "price", quote_source),
+        "52 weeks high": metric(high_52 or None, "price", quote_source),
+        "latest expiration date": metric(latest_expiry, "date", "Yahoo Finance"),
+        "Total insider ownership %": metric(
+            insider_own_pct * 100 if insider_own_pct is not None else None, "percent", insider_source),
+    }
+
+
+def latest_statement_period(ticker_symbol):
+    """
+    Cheap filing-change probe: end date (YYYY-MM-DD) of the latest quarterly balance sheet,
+    from Yahoo Finance with Alpha Vantage as backup. None if neither has one.
+    """
+    try:
+        periods = yahoo_payload(ticker_symbol, "quarterly_balance_sheet",
+                                lambda: yf.Ticker(ticker_symbol).quarterly_balance_sheet).columns
+        if len(periods):
+            return pd.Timestamp(max(periods)).strftime("%Y-%m-%d")
+    except Exception as e:
+        logging.warning(f"Yahoo statement period lookup failed for {ticker_symbol}: {e}")
+    proxy_url = get_proxy_url()
+    reports = alpha_vantage_getter(ticker_symbol, {"http": proxy_url, "https": proxy_url})("BALANCE_SHEET") \
+        .get("quarterlyReports", [])
+    return reports[0].get("fiscalDateEnding") if reports else None
+
+
+def run_market_snapshot(ticker_symbol):
+    """
+    Quote-only variant of run_comprehensive_analysis, used by refreshes when no new filing
+    has landed since the stored analysis. Same result shape, with data["market_only"] set.
+    """
+    proxy_url = get_proxy_url()
+    av_get = alpha_vantage_getter(ticker_symbol, {"http": proxy_url, "https": proxy_url})
+    results = {"ticker": ticker_symbol, "status": "success", "data": {}, "error": None}
+    try:
+        ticker = yf.Ticker(ticker_symbol)
+        info = yahoo_payload(ticker_symbol, "info", lambda: ticker.info)
+        results["data"] = {"Summary": quote_metrics(ticker_symbol, ticker, info, av_get), "market_only": True}
+    except Exception as e:
+        logging.error(f"Market snapshot failed for {ticker_symbol}: {e}")
+        results["status"] = "error"
+        results["error"] = str(e)
+    return results
+
+
+def run_comprehensive_analysis(ticker_symbol):
+    proxy_url = get_proxy_url()
+
     # Proxy dictionary for requests (Alpha Vantage)
     proxies = {
         "http": proxy_url,
@@ -69,31 +181,22 @@ def run_comprehensive_analysis(ticker_symbol):
     results = {"ticker": ticker_symbol, "status": "success", "data": {}, "error": None}
 
     # Initialize variables for the final report
-    current_price = None
     market_cap = None
-    low_52 = None
-    high_52 = None
-    latest_expiry = "N/A"
-    insider_val = "N/A"
     total_assets = None
     total_liabilities = None
     al_ratio = None
-    runway_val = "N/A"
+    runway_months = None
     ebitda = None
     net_debt_raw = None
-    nd_ebitda_val = "N/A"
-    severity_val = "N/A"
-    share_growth_val = "N/A"
-    dol_val = "N/A"
+    nd_ebitda_val = None
+    severity_pct = None
+    severity_note = None
+    share_growth_pct = None
+    dol_val = None
     csp_status = "No converts / ATM"
-    shares_outstanding = None
 
-    # Helper to clean Alpha Vantage string values from second code
-    def av_clean(val):
-        try:
-            return float(val) if val and str(val).lower() != "none" else 0.0
-        except (ValueError, TypeError):
-            return 0.0
+    # Each Alpha Vantage endpoint is requested at most once per analysis
+    av_get = alpha_vantage_getter(ticker_symbol, proxies)
 
     while retry_count < max_retries:
         try:
@@ -102,245 +205,91 @@ def run_comprehensive_analysis(ticker_symbol):
             
             ticker = yf.Ticker(ticker_symbol)
 
-            # Fetching Info and Dataframes
-            info = ticker.info
-            q_balance_sheet = ticker.quarterly_balance_sheet
-            a_balance_sheet = ticker.balance_sheet
-            q_cash_flow = ticker.quarterly_cashflow
-            a_financials = ticker.financials
-
-            # 1. Price, Low, High, Market Cap (YFinance primary)
-            current_price = info.get('currentPrice') or info.get('regularMarketPrice')
-            market_cap = info.get('marketCap')
-            shares_outstanding = info.get('sharesOutstanding')
-            low_52 = info.get('fiftyTwoWeekLow')
-            high_52 = info.get('fiftyTwoWeekHigh')
-
-            # --- Alpha Vantage Backup for Price/Cap/Shares/Range (from second code) ---
-            if not current_price or not market_cap:
-                logging.info(f"Price/Cap missing in YF for {ticker_symbol}. Checking Alpha Vantage...")
-                try:
-                    ov_url = f"https://www.alphavantage.co/query?function=OVERVIEW&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
-                    ov_resp = requests.get(ov_url, proxies=proxies, timeout=15)
-                    ov_data = ov_resp.json()
-                    
-                    if not current_price:
-                        gq_url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
-                        gq_resp = requests.get(gq_url, proxies=proxies, timeout=15)
-                        gq_data = gq_resp.json().get("Global Quote", {})
-                        current_price = av_clean(gq_data.get("05. price"))
-                    
-                    if not market_cap:
-                        market_cap = av_clean(ov_data.get("MarketCapitalization"))
-                    if not shares_outstanding:
-                        shares_outstanding = av_clean(ov_data.get("SharesOutstanding"))
-                    if not low_52:
-                        low_52 = av_clean(ov_data.get("52WeekLow"))
-                    if not high_52:
-                        high_52 = av_clean(ov_data.get("52WeekHigh"))
-                except Exception as e:
-                    logging.error(f"AV Price Backup Error for {ticker_symbol}: {e}")
-
-            # 4. Latest expiration date
-            try:
-                options = ticker.options
-                latest_expiry = options[-1] if options else "N/A"
-            except Exception:
-                latest_expiry = "N/A"
-
-            # 5. Total insider ownership % (YF primary, AV Backup from second code)
-            insider_own_pct = info.get('heldPercentInsiders')
-            if insider_own_pct is None:
-                try:
-                    ov_url = f"https://www.alphavantage.co/query?function=OVERVIEW&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
-                    ov_resp = requests.get(ov_url, proxies=proxies, timeout=15)
-                    ov_data = ov_resp.json()
-                    insider_own_pct = av_clean(ov_data.get("PercentInsiders")) / 100.0 if ov_data.get("PercentInsiders") else None
-                except:
-                    pass
-            insider_val = f"{insider_own_pct * 100:.2f}%" if insider_own_pct is not None else "N/A"
-
-            # 6. Total Assets & Liabilities (YF primary)
-            total_assets, _ = get_latest_metric(q_balance_sheet, ['Total Assets'])
-            total_liabilities, _ = get_latest_metric(q_balance_sheet, [
-                'Total Liabilities Net Minor Interest', 'Total Liab', 'Total Liabilities'
-            ])
-
-            # Fallback for Liabilities (YFinance specific logic from code 1)
-            if total_liabilities is None:
-                curr_l, _ = get_latest_metric(q_balance_sheet, ['Current Liabilities', 'Total Current Liabilities'])
-                non_curr_l, _ = get_latest_metric(q_balance_sheet, [
-                    'Total Non Current Liabilities Net Minority Interest', 'Non Current Liabilities'
-                ])
-                if curr_l is not None or non_curr_l is not None:
-                    total_liabilities = (curr_l or 0) + (non_curr_l or 0)
-
-            # --- Alpha Vantage Fallback for Assets/Liabilities (from second code) ---
-            if total_assets is None or total_liabilities is None:
-                try:
-                    av_bs_url = f"https://www.alphavantage.co/query?function=BALANCE_SHEET&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
-                    av_bs_resp = requests.get(av_bs_url, proxies=proxies, timeout=15)
-                    av_bs_data = av_bs_resp.json()
-                    reports = av_bs_data.get("quarterlyReports", [])
-                    if reports:
-                        if total_assets is None:
-                            total_assets = av_clean(reports[0].get("totalAssets"))
-                        if total_liabilities is None:
-                            total_liabilities = av_clean(reports[0].get("totalLiabilities"))
-                except:
-                    pass
+            # Fetching Info and normalizing statements into canonical, period-indexed frames
+            info = yahoo_payload(ticker_symbol, "info", lambda: ticker.info)
+            statements = {name: yahoo_payload(ticker_symbol, name, lambda: getattr(ticker, name))
+                          for name in ("quarterly_balance_sheet", "quarterly_cashflow", "balance_sheet", "financials")}
+            quarterly = normalize_yahoo(statements["quarterly_balance_sheet"], statements["quarterly_cashflow"])
+            annual = normalize_yahoo(statements["balance_sheet"], statements["financials"])
+
+            # 1-5. Price, market cap, range, option expiry, insider ownership
+            quote = quote_metrics(ticker_symbol, ticker, info, av_get)
+            market_cap = quote["Market cap"].value
+
+            # --- Alpha Vantage Fallback for statement gaps (one request per endpoint) ---
+            av_fields = set()
+            q_gaps = missing_fields(quarterly, QUARTERLY_REQUIRED)
+            a_gaps = missing_fields(annual, ANNUAL_REQUIRED) + missing_fields(annual, ANNUAL_YOY_REQUIRED, periods=2)
+            if q_gaps or a_gaps:
+                logging.info(f"Statement gaps for {ticker_symbol} in Yahoo: {q_gaps + a_gaps}. Querying Alpha Vantage...")
+                q_reports = [av_get(f).get("quarterlyReports", []) for f in sorted(alpha_vantage_functions_for(q_gaps))]
+                a_reports = [av_get(f).get("annualReports", []) for f in sorted(alpha_vantage_functions_for(a_gaps))]
+                quarterly = merge_statements(quarterly, normalize_alpha_vantage(*q_reports))
+                annual = merge_statements(annual, normalize_alpha_vantage(*a_reports))
+                av_fields = (set(q_gaps) - set(missing_fields(quarterly, q_gaps))) | \
+                            (set(a_gaps) - set(missing_fields(annual, a_gaps)))
+
+            def source_for(*fields):
+                return "Alpha Vantage" if av_fields.intersection(fields) else "Yahoo Finance"
+
+            # 6. Total Assets & Liabilities (liabilities fall back to current + non-current)
+            total_assets = latest(quarterly, "total_assets")
+            total_liabilities = latest(quarterly, "total_liabilities")
 
             # 7. Assets / Liabilities Ratio
             if total_assets and total_liabilities and total_liabilities != 0:
                 al_ratio = round(total_assets / total_liabilities, 2)
 
             # 8. Runway (Quarterly Cash / Monthly Burn)
-            current_cash, _ = get_latest_metric(q_balance_sheet, [
-                'Cash And Cash Equivalents', 'Cash Cash Equivalents And Short Term Investments'
-            ])
-            quarterly_ocf, _ = get_latest_metric(q_cash_flow, ['Operating Cash Flow'])
-
-            # --- Alpha Vantage Fallback for Runway (from second code) ---
-            if current_cash is None or quarterly_ocf is None:
-                try:
-                    av_bs_url = f"https://www.alphavantage.co/query?function=BALANCE_SHEET&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
-                    av_cf_url = f"https://www.alphavantage.co/query?function=CASH_FLOW&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
-                    if current_cash is None:
-                        av_bs_resp = requests.get(av_bs_url, proxies=proxies, timeout=15)
-                        current_cash = av_clean(av_bs_resp.json().get("quarterlyReports", [{}])[0].get("cashAndCashEquivalentsAtCarryingValue"))
-                    if quarterly_ocf is None:
-                        av_cf_resp = requests.get(av_cf_url, proxies=proxies, timeout=15)
-                        quarterly_ocf = av_clean(av_cf_resp.json().get("quarterlyReports", [{}])[0].get("operatingCashflow"))
-                except:
-                    pass
+            current_cash = latest(quarterly, "cash")
+            quarterly_ocf = latest(quarterly, "operating_cash_flow")
 
             if current_cash is not None and quarterly_ocf is not None:
                 if quarterly_ocf < 0:
                     monthly_burn = abs(quarterly_ocf) / 3
-                    runway_val = f"{current_cash / monthly_burn:.2f} Months"
+                    runway_months = current_cash / monthly_burn
                 else:
-                    runway_val = "Positive OCF (No Burn)"
-
-            # 9. Net Debt / EBITDA
-            ebitda, _ = get_latest_metric(a_financials, ['EBITDA', 'Normalized EBITDA'])
-            net_debt_raw, _ = get_latest_metric(a_balance_sheet, ['Net Debt'])
-
-            if net_debt_raw is None:
-                total_debt, _ = get_latest_metric(a_balance_sheet, ['Total Debt'])
-                cash_comp, _ = get_latest_metric(a_balance_sheet, ['Cash And Cash Equivalents'])
-                if total_debt is not None and cash_comp is not None:
-                    net_debt_raw = total_debt - cash_comp
-
-            # --- Comprehensive Alpha Vantage Fallback for EBITDA and Net Debt (from second code) ---
-            if ebitda is None or net_debt_raw is None:
-                logging.info(f"EBITDA/Net Debt missing for {ticker_symbol} in Yahoo. Querying Alpha Vantage...")
-                try:
-                    av_bs_url = f"https://www.alphavantage.co/query?function=BALANCE_SHEET&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
-                    av_inc_url = f"https://www.alphavantage.co/query?function=INCOME_STATEMENT&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
-
-                    if ebitda is None:
-                        inc_resp = requests.get(av_inc_url, proxies=proxies, timeout=15)
-                        ebitda = av_clean(inc_resp.json().get("annualReports", [{}])[0].get("ebitda"))
-
-                    if net_debt_raw is None:
-                        bs_resp = requests.get(av_bs_url, proxies=proxies, timeout=15)
-                        report = bs_resp.json().get("annualReports", [{}])[0]
-                        av_cash = av_clean(report.get("cashAndCashEquivalentsAtCarryingValue"))
-                        av_st_debt = av_clean(report.get("shortTermDebt"))
-                        av_lt_debt = av_clean(report.get("longTermDebt"))
-                        net_debt_raw = (av_st_debt + av_lt_debt) - av_cash
-                except Exception as av_err:
-                    print(f"Alpha Vantage Debt/EBITDA backup failed for {ticker_symbol}: {str(av_err)}", file=sys.stderr)
+                    runway_months = float("inf")  # Positive OCF (No Burn)
+
+            # 9. Net Debt / EBITDA (net debt falls back to total debt - cash)
+            ebitda = latest(annual, "ebitda")
+            net_debt_raw = latest(annual, "net_debt")
 
             if ebitda is not None and ebitda != 0 and net_debt_raw is not None:
                 nd_ebitda_val = round(net_debt_raw / ebitda, 2)
 
-            # 10. Cash Burn Severity
-            fcf_ttm = None
-            if q_cash_flow is not None and 'Free Cash Flow' in q_cash_flow.index:
-                fcf_ttm = q_cash_flow.loc['Free Cash Flow'].iloc[:4].sum()
-
-            # --- Alpha Vantage Fallback for FCF (from second code) ---
-            if fcf_ttm is None:
-                try:
-                    av_cf_url = f"https://www.alphavantage.co/query?function=CASH_FLOW&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
-                    cf_resp = requests.get(av_cf_url, proxies=proxies, timeout=15)
-                    q_reports = cf_resp.json().get("quarterlyReports", [])[:4]
-                    if q_reports:
-                        fcf_ttm = sum([av_clean(r.get("operatingCashflow")) - av_clean(r.get("capitalExpenditures")) for r in q_reports])
-                except:
-                    pass
+            # 10. Cash Burn Severity (TTM free cash flow vs market cap)
+            fcf_ttm = ttm(quarterly, "free_cash_flow", periods=4)
 
             if market_cap and fcf_ttm is not None and fcf_ttm < 0:
-                severity_val = f"{(abs(fcf_ttm) / market_cap) * 100:.2f}%"
+                severity_pct = (abs(fcf_ttm) / market_cap) * 100
             elif fcf_ttm is not None and fcf_ttm >= 0:
-                severity_val = "0.00% (Positive FCF)"
+                severity_pct, severity_note = 0.0, "Positive FCF"
 
-            # 11. Share Count Growth (Calculation exactly same as in first code)
+            # 11. Share Count Growth (3-year CAGR from the local, incrementally updated share-count store)
             try:
-                shares_data = ticker.get_shares_full(start=datetime.now() - pd.DateOffset(years=5))
-                if shares_data is not None and not shares_data.empty:
-                    shares_data = shares_data.sort_index().iloc[~shares_data.index.duplicated(keep='last')]
-                    if len(shares_data) > 1:
-                        latest_idx = -1
-                        target_date = shares_data.index[latest_idx] - pd.DateOffset(years=3)
-                        idx_3y = shares_data.index.get_indexer([target_date], method='nearest')[0]
-                        if idx_3y != -1 and idx_3y < (len(shares_data) + latest_idx):
-                            latest_s = shares_data.iloc[latest_idx]
-                            hist_s = shares_data.iloc[idx_3y]
-                            years_diff = (shares_data.index[latest_idx] - shares_data.index[idx_3y]).days / 365.25
-                            if (pd.notnull(latest_s) and pd.notnull(hist_s) and
-                                    hist_s > 0 and latest_s > 0 and years_diff > 0):
-                                cagr = ((latest_s / hist_s) ** (1 / years_diff)) - 1
-                                share_growth_val = f"{cagr * 100:.2f}%"
+                share_dates, share_counts = get_share_history(ticker, ticker_symbol)
+                cagr = share_count_cagr(share_dates, share_counts, years=3)
+                if cagr is not None:
+                    share_growth_pct = cagr * 100
             except Exception:
-                share_growth_val = "N/A"
-
-            # 12. Degree of Operating Leverage (DOL)
-            if a_financials is not None and a_financials.shape[1] >= 2 and 'Total Revenue' in a_financials.index:
-                sales = a_financials.loc['Total Revenue']
-                ebit_v, ebit_k = get_latest_metric(a_financials, ['EBIT', 'Operating Income'])
-                if ebit_v is not None:
-                    ebit_row = a_financials.loc[ebit_k]
-                    pct_sales = (sales.iloc[0] - sales.iloc[1]) / abs(sales.iloc[1]) if sales.iloc[1] != 0 else 0
-                    pct_ebit = (ebit_row.iloc[0] - ebit_row.iloc[1]) / abs(ebit_row.iloc[1]) if ebit_row.iloc[1] != 0 else 0
-                    if pct_sales != 0:
-                        dol_val = round(pct_ebit / pct_sales, 2)
-
-            # --- Alpha Vantage Fallback for DOL (from second code) ---
-            if dol_val == "N/A":
-                try:
-                    av_inc_url = f"https://www.alphavantage.co/query?function=INCOME_STATEMENT&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
-                    inc_resp = requests.get(av_inc_url, proxies=proxies, timeout=15)
-                    reports = inc_resp.json().get("annualReports", [])
-                    if len(reports) >= 2:
-                        s1, s2 = av_clean(reports[0].get("totalRevenue")), av_clean(reports[1].get("totalRevenue"))
-                        e1, e2 = av_clean(reports[0].get("operatingIncome")), av_clean(reports[1].get("operatingIncome"))
-                        p_sales = (s1 - s2) / abs(s2) if s2 != 0 else 0
-                        p_ebit = (e1 - e2) / abs(e2) if e2 != 0 else 0
-                        if p_sales != 0:
-                            dol_val = round(p_ebit / p_sales, 2)
-                except:
-                    pass
+                share_growth_pct = None
+
+            # 12. Degree of Operating Leverage (DOL = YoY EBIT change / YoY sales change)
+            pct_sales = yoy(annual, "total_revenue")
+            pct_ebit = yoy(annual, "ebit")
+            if pct_sales and pct_ebit is not None:
+                dol_val = round(pct_ebit / pct_sales, 2)
 
             # 13. Capital Structure Pressure (CSP)
             debt_to_equity = info.get('debtToEquity', 0)
             
             # --- Alpha Vantage Fallback for DebtToEquity (from second code) ---
             if not debt_to_equity:
-                try:
-                    ov_url = f"https://www.alphavantage.co/query?function=OVERVIEW&symbol={ticker_symbol}&apikey={ALPHA_VANTAGE_KEY}"
-                    ov_resp = requests.get(ov_url, proxies=proxies, timeout=15)
-                    debt_to_equity = av_clean(ov_resp.json().get("DebtToEquityRatio")) * 100
-                except:
-                    pass
-
-            convert_labels = []
-            if a_balance_sheet is not None:
-                convert_labels = [idx for idx in a_balance_sheet.index if 'convertible' in str(idx).lower()]
+                debt_to_equity = av_clean(av_get("OVERVIEW").get("DebtToEquityRatio")) * 100
 
-            has_converts = len(convert_labels) > 0
-            convert_val = a_balance_sheet.loc[convert_labels[0]].iloc[0] if has_converts else 0
+            convert_val = latest(annual, "convertible_debt")
+            has_converts = pd.notna(convert_val) and convert_val != 0
 
             if (debt_to_equity and debt_to_equity > 300):
                 csp_status = "Heavy converts / ATM"
@@ -353,29 +302,29 @@ def run_comprehensive_analysis(ticker_symbol):
             elif debt_to_equity and debt_to_equity > 100:
                 csp_status = "Heavy converts / ATM"
 
-            # Formatting results as per final_metrics dictionary in both codes
+            # Typed metric records; formatting happens only at render time
+            q_as_of = quarterly.index[0] if not quarterly.empty else None
+            a_as_of = annual.index[0] if not annual.empty else None
             final_metrics = {
-                "Current stock price": f"{current_price:.2f}" if current_price else "N/A",
-                "Market cap": format_large_number(market_cap),
-                "Shares Outstanding": format_large_number(shares_outstanding),
-                "52 week low": f"{low_52:.2f}" if low_52 else "N/A",
-                "52 weeks high": f"{high_52:.2f}" if high_52 else "N/A",
-                "latest expiration date": latest_expiry,
-                "Total insider ownership %": insider_val,
-                "Total Assets": format_large_number(total_assets),
-                "Total Liabilities": format_large_number(total_liabilities),
-                "Assets / Liabilities Ratio": al_ratio if al_ratio is not None else "N/A",
-                "Runway": runway_val,
-                "Net Debt": format_large_number(net_debt_raw),
-                "EBITDA": format_large_number(ebitda),
-                "Net Debt / EBITDA": nd_ebitda_val,
-                "Cash Burn Severity": severity_val,
-                "Share Count Growth": share_growth_val,
-                "Degree of Operating Leverage": dol_val,
-                "Capital Structure Pressure": csp_status
+                **quote,
+                "Total Assets": metric(total_assets, "usd", source_for("total_assets"), q_as_of),
+                "Total Liabilities": metric(total_liabilities, "usd", source_for("total_liabilities"), q_as_of),
+                "Assets / Liabilities Ratio": metric(
+                    al_ratio, "ratio", source_for("total_assets", "total_liabilities"), q_as_of),
+                "Runway": metric(runway_months, "months", source_for("cash", "operating_cash_flow"), q_as_of),
+                "Net Debt": metric(net_debt_raw, "usd", source_for("net_debt"), a_as_of),
+                "EBITDA": metric(ebitda, "usd", source_for("ebitda"), a_as_of),
+                "Net Debt / EBITDA": metric(nd_ebitda_val, "ratio", source_for("net_debt", "ebitda"), a_as_of),
+                "Cash Burn Severity": metric(
+                    severity_pct, "percent", source_for("free_cash_flow"), q_as_of, note=severity_note),
+                "Share Count Growth": metric(share_growth_pct, "percent", "Yahoo Finance"),
+                "Degree of Operating Leverage": metric(
+                    dol_val, "ratio", source_for("total_revenue", "ebit"), a_as_of),
+                "Capital Structure Pressure": metric(csp_status, "category", "Yahoo Finance", a_as_of)
             }
 
-            results["data"] = {"Summary": final_metrics}
+            results["data"] = {"Summary": final_metrics,
+                               "Filing period": q_as_of.strftime("%Y-%m-%d") if q_as_of is not None else None}
             return results
 
         except Exception as e:
@@ -384,7 +333,7 @@ def run_comprehensive_analysis(ticker_symbol):
 
             if retry_count < max_retries:
                 logging.info(f"Retrying with proxy in 2 seconds...")
-                time.sleep(2)
+                snapshots.pause("yahoo", 2)
             else:
                 results["status"] = "error"
                 results["error"] = f"Final failure for {ticker_symbol} after {max_retries} attempts via proxy: {str(e)}"